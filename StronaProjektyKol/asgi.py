@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StronaProjektyKol.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after Django is set up, the stream uses models
+from StronaProjektyKol.settings import SCHEDULER_ASGI_LIFESPAN  # noqa: E402
+from messaging.stream import MessageStreamApplication  # noqa: E402
+from scheduler.lifespan import SchedulerLifespanApplication  # noqa: E402
+
+application = MessageStreamApplication(django_application)
+
+# periodic jobs are run by the server process, every job is run by only one process at a time
+if SCHEDULER_ASGI_LIFESPAN:
+    application = SchedulerLifespanApplication(application)
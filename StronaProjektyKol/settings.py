@@ -23,6 +23,8 @@ INSTALLED_APPS = [
     'papers.apps.PapersConfig',
     'users.apps.UsersConfig',
     'documents.apps.DocumentsConfig',
+    'mailing.apps.MailingConfig',
+    'scheduler.apps.SchedulerConfig',
     'django_summernote',
     'django_filters',
     'django.contrib.admin',
@@ -60,6 +62,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'messaging.context_processors.unread_messages',
             ],
         },
     },
@@ -174,6 +177,92 @@ DATABASES = {
     }
 }
 
+# Cache (filter results, counters, conversation watermarks, group names)
+# Entries are invalidated by the process handling the change, so when the site is served by more than one process
+# the cache must be shared by all of them (e.g. Memcached or Redis), local memory cache is enough only for one process.
+# python manage.py check --deploy warns about it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# how long (in seconds) ordered result of papers filter is kept for pagination and prev/next navigation
+PAPERS_FILTER_CACHE_TIMEOUT = 60 * 60
+
+# how long (in seconds) rendered cards of papers and documents are kept, cards are invalidated on every change
+CARDS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# how long (in seconds) group names of a user are kept, they are invalidated on every membership change,
+# revoked group stays active in processes which don't share the cache (see CACHES)
+USER_GROUPS_CACHE_TIMEOUT = 60 * 60
+
+# how often (in seconds) times when users were last seen are saved, they are kept in memory in between
+USER_ACTIVITY_FLUSH_INTERVAL = 60
+
+# activity recorded during tests is kept apart from the buffer of the process
+TEST_RUNNER = 'StronaProjektyKol.test_runner.TestRunner'
+
+# pub/sub used to push new messages to open conversation streams, LocalBackend works only within one process,
+# with several ASGI workers it has to be replaced with a cross-process backend (see messaging.pubsub.BaseBackend)
+MESSAGING_PUBSUB_BACKEND = 'messaging.pubsub.LocalBackend'
+
+# interval (in seconds) of keepalive comments sent on idle message streams
+MESSAGING_STREAM_KEEPALIVE = 15
+
+# after this time (in seconds) message stream is closed and the browser reconnects
+MESSAGING_STREAM_TIMEOUT = 60 * 5
+
+# how long (in seconds) id of the newest message of a conversation is kept for "nothing new" answers to polling
+MESSAGING_WATERMARK_TIMEOUT = 60 * 60 * 24
+
+# how long (in seconds) confirmed access of a session to a conversation is trusted by the polling fast path
+MESSAGING_ACCESS_CACHE_TIMEOUT = 60 * 5
+
+# number of messages loaded when a conversation is opened and when its history is scrolled up
+MESSAGING_HISTORY_PAGE_SIZE = 30
+
+# how long (in seconds) total number of user's unread messages is kept, it is updated on every sent and read message
+MESSAGING_UNREAD_CACHE_TIMEOUT = 60 * 10
+
+# number of results on a page of messages search
+MESSAGING_SEARCH_PAGE_SIZE = 20
+
+# conversations of papers without any message for this many days are moved to the archive by archive_conversations
+MESSAGING_ARCHIVE_AFTER_DAYS = 365
+
+# emails are stored in the outbox and sent by send_queued_emails worker in batches over one connection
+MAILING_BATCH_SIZE = 50
+
+# maximal number of emails sent in a minute, None means no limit
+MAILING_RATE_LIMIT = 60
+
+# failed email is retried after MAILING_RETRY_DELAY seconds, the delay is doubled after every failure,
+# after MAILING_MAX_ATTEMPTS failures it is left in the outbox as dead
+MAILING_RETRY_DELAY = 60
+MAILING_MAX_ATTEMPTS = 5
+
+# how long (in seconds) email taken by a worker is not given to other workers
+MAILING_CLAIM_TIMEOUT = 60 * 5
+
+# how long (in seconds) worker waits when the outbox is empty
+MAILING_WORKER_INTERVAL = 10
+
+# maximal number of recipients of one message sent by mass email, SMTP servers limit it (often to 100)
+MAILING_BCC_CHUNK_SIZE = 50
+
+# sent emails are removed from the outbox after this many days
+MAILING_SENT_RETENTION_DAYS = 30
+
+# how often (in seconds) scheduler checks if any periodic job is due
+SCHEDULER_TICK = 30
+
+# how long (in seconds) a job is locked by the process running it, after that time other process may run it again
+SCHEDULER_LOCK_TIMEOUT = 60 * 30
+
+# if True, periodic jobs are run by the ASGI server process (lifespan task), otherwise run_scheduler command is needed
+SCHEDULER_ASGI_LIFESPAN = True
+
 SITE_NAME = 'Projekty Kół Naukowych Politechniki Rzeszowskiej'
 SITE_DOMAIN = 'localhost'
 SITE_ADMIN_MAIL = 'admin@pracekol.pl'
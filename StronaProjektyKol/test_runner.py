@@ -0,0 +1,19 @@
+from django.test.runner import DiscoverRunner
+
+from users import activity
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Replaces the process-wide activity buffer for the time of tests, so activity recorded by test requests
+    is neither saved by the background thread nor flushed into the real database when the process exits
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._activity_buffer = activity.buffer
+        activity.buffer = activity.ActivityBuffer(autoflush=False)
+
+    def teardown_test_environment(self, **kwargs):
+        activity.buffer = self._activity_buffer
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from papers.cache import bump_card_versions
+from papers.models import StudentClub
+from .models import Document, UploadedFile
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def invalidate_document_card(sender, instance, **kwargs):
+    """
+    Invalidates cached card of the document displayed on documents list
+    :param sender: Document class
+    :param instance: Document object that was changed
+    :param kwargs:
+    :return:
+    """
+    bump_card_versions('document', [instance.pk])
+
+
+@receiver(post_save, sender=UploadedFile)
+@receiver(post_delete, sender=UploadedFile)
+def invalidate_related_document_card(sender, instance, **kwargs):
+    bump_card_versions('document', [instance.document_id])
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    # deferred field is not read, it would query the database for every loaded user
+    instance._saved_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_documents_cards(sender, instance, created, update_fields, **kwargs):
+    """
+    Invalidates cards of documents which display user's username, only when the username has changed
+    :param sender: User class
+    :param instance: User object that was saved
+    :param created: boolean
+    :param update_fields: frozenset of saved fields' names or None (all fields)
+    :param kwargs:
+    :return:
+    """
+    if created or (update_fields is not None and 'username' not in update_fields) \
+            or instance.username == getattr(instance, '_saved_username', None):
+        return
+    instance._saved_username = instance.username
+    bump_card_versions('document', instance.document_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=StudentClub)
+def invalidate_club_documents_cards(sender, instance, created, **kwargs):
+    if not created:
+        bump_card_versions('document', instance.document_set.values_list('pk', flat=True))
@@ -1,6 +1,8 @@
 from django import template
 from django.contrib.auth.models import Group
-from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from papers.cache import get_card
 
 register = template.Library()
 
@@ -34,6 +36,7 @@ def addstr(arg1, arg2):
 def print_document(document, link, user):
     context = dict()
     context['document'] = document
-    context['link'] = link
     context['user'] = user
-    return render_to_string('documents/document_list_element.html', context=context)
+    # link differs between requests, so it is inserted into the cached card
+    html = get_card('document', document.pk, 'all', 'documents/document_list_element.html', context, {'link': link})
+    return mark_safe(html)
@@ -1,3 +1,25 @@
+from django.contrib.auth.models import User, update_last_login
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from papers.cache import get_card_version
+from .models import Document
+
+
+class DocumentCardTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.document = Document.objects.create(author=self.author, name='Document')
+
+    def test_card_is_invalidated_only_when_username_changes(self):
+        version = get_card_version('document', self.document.pk)
+        with CaptureQueriesContext(connection) as queries:
+            update_last_login(None, self.author)
+        self.assertFalse([query for query in queries if 'documents_document' in query['sql']])
+        User.objects.get(pk=self.author.pk).save()
+        self.assertEqual(get_card_version('document', self.document.pk), version)
+
+        self.author.username = 'new_author'
+        self.author.save()
+        self.assertNotEqual(get_card_version('document', self.document.pk), version)
@@ -12,6 +12,7 @@ from django.shortcuts import redirect
 from django.views.static import serve
 
 from StronaProjektyKol.settings import SITE_NAME, BASE_DIR
+from papers.permissions import MemoizedObjectMixin, can_view_document, can_edit_document
 from .models import Document, UploadedFile
 from .filters import DocumentFilter
 from .forms import *
@@ -31,7 +32,8 @@ class DocumentListView(LoginRequiredMixin, ListView):
 
         context['filter'] = DocumentFilter(self.request.GET, queryset=self.get_queryset())
 
-        documents = context['filter'].qs.order_by('-created_at')
+        documents = context['filter'].qs.select_related('author', 'club') \
+            .prefetch_related('uploadedfile_set').order_by('-created_at')
 
         context['documents_length'] = documents.count()
 
@@ -54,11 +56,14 @@ class DocumentListView(LoginRequiredMixin, ListView):
         return Document.objects.all().filter(author=self.request.user)
 
 
-class DocumentDetailView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixin, DetailView):
+class DocumentDetailView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixin, MemoizedObjectMixin, DetailView):
     login_url = 'login'
     model = Document
     context_object_name = 'document'
 
+    def get_queryset(self):
+        return Document.objects.select_related('author', 'club')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['site_title'] = f'Informacje o dokumencie - {SITE_NAME}'
@@ -66,12 +71,7 @@ class DocumentDetailView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixi
         return context
 
     def test_func(self):
-        document = self.get_object()
-        if self.request.user == document.author or self.request.user.groups.filter(name='reviewer').exists()\
-                or self.request.user.is_staff:
-            return True
-        else:
-            return False
+        return can_view_document(self.request.user, self.get_object())
 
     def handle_no_permission(self):
         return redirect('documentList')
@@ -87,8 +87,7 @@ def document_file_download(request, pk, item):
     :return:
     """
     document = Document.objects.get(pk=pk)
-    if request.user == document.author or request.user.groups.filter(
-            name='reviewer').exists() or request.user.is_staff:
+    if can_view_document(request.user, document):
         document = UploadedFile.objects.get(pk=item)
         filepath = str(BASE_DIR)+document.file.url
         return serve(request, os.path.basename(filepath), os.path.dirname(filepath))
@@ -145,16 +144,13 @@ class DocumentCreateView(LoginRequiredMixin, CreateView):
         return str('/documents/')
 
 
-class DocumentEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class DocumentEditView(LoginRequiredMixin, UserPassesTestMixin, MemoizedObjectMixin, UpdateView):
     model = Document
     form_class = DocumentCreationForm
     template_name = 'documents/document_add.html'
 
     def test_func(self):
-        document = self.get_object()
-        if self.request.user == document.author:
-            return True
-        return False
+        return can_edit_document(self.request.user, self.get_object())
 
     def post(self, request, *args, **kwargs):
 
@@ -177,7 +173,7 @@ class DocumentEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
             context['files'] = UploadFileFormSet()
 
         context['uploaded_files'] = UploadedFile.objects.filter(
-            document=self.get_object())
+            document=self.object)
 
         context['filesForm'] = render_to_string('papers/upload_files_formset.html',
                                                 {'formset': context['files']})
@@ -207,23 +203,19 @@ class DocumentEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
 
     def get_success_url(self):
         messages.success(self.request, f'Dokument został zmieniony')
-        document = self.get_object()
-        return str('/documents/document/' + str(document.pk) + '/')
+        return str('/documents/document/' + str(self.object.pk) + '/')
 
     def handle_no_permission(self):
         return redirect('documentList')
 
 
-class DocumentDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class DocumentDeleteView(LoginRequiredMixin, UserPassesTestMixin, MemoizedObjectMixin, DeleteView):
     model = Document
     template_name = 'documents/document_delete.html'
     success_url = '/documents'
 
     def test_func(self):
-        document = self.get_object()
-        if self.request.user == document.author:
-            return True
-        return False
+        return can_edit_document(self.request.user, self.get_object())
 
     def handle_no_permission(self):
         return redirect('documentList')
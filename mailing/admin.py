@@ -0,0 +1,28 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'created_at', 'sent_at', 'next_attempt_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at', 'sensitive')
+    actions = ('retry',)
+
+    def get_exclude(self, request, obj=None):
+        # e.g. password reset link must not be visible to administrators
+        if obj is not None and obj.sensitive:
+            return 'body', 'html_body'
+        return super().get_exclude(request, obj)
+
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=OutgoingEmail.SENT) \
+            .update(status=OutgoingEmail.PENDING, attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{count} emails will be sent again')
+
+    retry.short_description = 'Wyślij ponownie'
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from StronaProjektyKol.settings import MAILING_WORKER_INTERVAL, MAILING_SENT_RETENTION_DAYS
+from scheduler.schedule import register
+from .models import OutgoingEmail
+from .outbox import send_queued
+
+
+@register('send_queued_emails', MAILING_WORKER_INTERVAL)
+def send_queued_emails():
+    # batches are sent until the outbox is empty or the rate limit is reached
+    while any(send_queued()):
+        pass
+
+
+@register('clean_outbox', timedelta(days=1))
+def clean_outbox():
+    OutgoingEmail.objects.filter(status=OutgoingEmail.SENT,
+                                 sent_at__lt=timezone.now() - timedelta(days=MAILING_SENT_RETENTION_DAYS)).delete()
@@ -0,0 +1,43 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from StronaProjektyKol.settings import MAILING_BATCH_SIZE, MAILING_WORKER_INTERVAL
+from mailing.outbox import send_queued
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Sends emails waiting in the outbox, with --loop it works as a worker until it is stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sending emails until the process is stopped')
+        parser.add_argument('--interval', type=float, default=MAILING_WORKER_INTERVAL,
+                            help='Seconds to wait when there is nothing to send')
+        parser.add_argument('--batch-size', type=int, default=MAILING_BATCH_SIZE,
+                            help='Number of emails sent over one connection')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                # connection broken by a previous error is replaced by a new one
+                close_old_connections()
+                try:
+                    sent, failed = send_queued(options['batch_size'])
+                except Exception:
+                    if not options['loop']:
+                        raise
+                    # e.g. database is unavailable, worker keeps running and tries again after the interval
+                    logger.exception('Unable to send queued emails')
+                    sent, failed = 0, 0
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent} emails, {failed} failed')
+                if not options['loop']:
+                    break
+                if not sent and not failed:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
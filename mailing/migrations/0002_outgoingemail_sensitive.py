@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outgoingemail',
+            name='sensitive',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """
+    Email waiting in the outbox, it is sent by send_queued_emails worker and not by the request which created it
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (PENDING, 'Oczekuje'),
+        (SENT, 'Wysłany'),
+        (DEAD, 'Nie udało się wysłać'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default='')
+    from_email = models.CharField(max_length=255)
+    # lists of addresses and headers stored as JSON
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    headers = models.JSONField(default=dict)
+    # content of sensitive email (e.g. password reset link) is hidden in the admin panel and removed after sending
+    sensitive = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # pending email is sent when this time comes, worker moves it forward when it takes or retries the email
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='mailing_outbox_due'),
+        ]
+
+    def __str__(self):
+        return f'[{self.get_status_display()}] {self.subject}'
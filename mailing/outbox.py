@@ -0,0 +1,169 @@
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from StronaProjektyKol.settings import MAILING_BATCH_SIZE, MAILING_RATE_LIMIT, MAILING_MAX_ATTEMPTS, \
+    MAILING_RETRY_DELAY, MAILING_CLAIM_TIMEOUT
+from .models import OutgoingEmail
+
+
+def prepare(email, sensitive=False):
+    """
+    Converts email to an unsaved outbox entry, headers are validated like when the email is sent,
+    so invalid email is rejected by the request and not by the worker
+    :param email: EmailMessage or EmailMultiAlternatives object
+    :param sensitive: boolean (if True, content of the email is not kept after sending)
+    :return: OutgoingEmail object
+    :raises BadHeaderError: when subject or an address contains new line
+    """
+    email.message()
+    headers = dict(email.extra_headers)
+    if email.reply_to:
+        headers.setdefault('Reply-To', ', '.join(email.reply_to))
+    html_body = next((content for content, mimetype in getattr(email, 'alternatives', [])
+                      if mimetype == 'text/html'), '')
+    return OutgoingEmail(subject=email.subject, body=email.body, html_body=html_body, from_email=email.from_email,
+                         to=list(email.to), cc=list(email.cc), bcc=list(email.bcc), headers=headers,
+                         sensitive=sensitive)
+
+
+def enqueue(emails, sensitive=False):
+    """
+    Stores emails in the outbox, they are sent later by send_queued_emails command
+    :param emails: iterable of EmailMessage objects
+    :param sensitive: boolean (if True, content of the emails is not kept after sending)
+    :return: list of OutgoingEmail objects
+    :raises BadHeaderError: when any of emails is invalid, nothing is stored then
+    """
+    return OutgoingEmail.objects.bulk_create([prepare(email, sensitive) for email in emails])
+
+
+def build(entry):
+    """
+    Recreates email from the outbox entry
+    :param entry: OutgoingEmail object
+    :return: EmailMultiAlternatives object
+    """
+    email = EmailMultiAlternatives(entry.subject, entry.body, entry.from_email, entry.to, cc=entry.cc,
+                                   bcc=entry.bcc, headers=entry.headers)
+    if entry.html_body:
+        email.attach_alternative(entry.html_body, 'text/html')
+    return email
+
+
+def retry_delay(attempts):
+    """
+    Returns delay before the next attempt, it is doubled after every failed attempt
+    :param attempts: integer (number of failed attempts)
+    :return: timedelta
+    """
+    return timedelta(seconds=MAILING_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def remaining_rate(now):
+    """
+    Returns number of emails which can be sent now without exceeding the per-minute limit
+    :param now: datetime
+    :return: integer or None (no limit)
+    """
+    if not MAILING_RATE_LIMIT:
+        return None
+    sent = OutgoingEmail.objects.filter(sent_at__gt=now - timedelta(minutes=1)).count()
+    return max(0, MAILING_RATE_LIMIT - sent)
+
+
+def claim(limit, now):
+    """
+    Takes due emails from the outbox, they are not due again until MAILING_CLAIM_TIMEOUT passes,
+    so other workers skip them and emails of a crashed worker are sent again later
+    :param limit: integer (maximal number of emails)
+    :param now: datetime
+    :return: list of OutgoingEmail objects
+    """
+    with transaction.atomic():
+        due = OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=now) \
+            .order_by('next_attempt_at', 'pk')
+        if db_connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        entries = list(due[:limit])
+        OutgoingEmail.objects.filter(pk__in=[entry.pk for entry in entries]) \
+            .update(next_attempt_at=now + timedelta(seconds=MAILING_CLAIM_TIMEOUT))
+    return entries
+
+
+def _record_failure(entry, error, now):
+    entry.attempts += 1
+    entry.last_error = f'{type(error).__name__}: {error}'
+    if entry.attempts >= MAILING_MAX_ATTEMPTS:
+        # dead letter, it is kept in the outbox and can be sent again from the admin panel
+        entry.status = OutgoingEmail.DEAD
+    else:
+        entry.next_attempt_at = now + retry_delay(entry.attempts)
+    entry.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _reconnect(connection):
+    """
+    Opens a new connection after an error, the previous one may be broken
+    :param connection: email backend connection
+    :return: exception raised while connecting or None
+    """
+    try:
+        connection.close()
+        connection.open()
+    except Exception as error:
+        return error
+    return None
+
+
+def send_queued(batch_size=MAILING_BATCH_SIZE, connection=None):
+    """
+    Sends one batch of due emails from the outbox over a single connection,
+    when the mail server can't be reached all remaining emails of the batch are retried later
+    :param batch_size: integer (maximal number of emails)
+    :param connection: email backend connection (default one if not given)
+    :return: tuple (number of sent emails, number of failed emails)
+    """
+    now = timezone.now()
+    rate = remaining_rate(now)
+    limit = batch_size if rate is None else min(batch_size, rate)
+    entries = claim(limit, now) if limit > 0 else []
+    if not entries:
+        return 0, 0
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for entry in entries:
+            _record_failure(entry, error, now)
+        return 0, len(entries)
+
+    sent, failed = [], 0
+    try:
+        for index, entry in enumerate(entries):
+            try:
+                if not connection.send_messages([build(entry)]):
+                    raise ValueError('Email has no recipients')
+                sent.append(entry.pk)
+            except Exception as error:
+                failed += 1
+                _record_failure(entry, error, now)
+                error = _reconnect(connection)
+                if error is not None:
+                    for remaining in entries[index + 1:]:
+                        failed += 1
+                        _record_failure(remaining, error, now)
+                    break
+    finally:
+        try:
+            connection.close()
+        finally:
+            OutgoingEmail.objects.filter(pk__in=sent) \
+                .update(status=OutgoingEmail.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='')
+            if any(entry.sensitive for entry in entries):
+                OutgoingEmail.objects.filter(pk__in=sent, sensitive=True).update(body='', html_body='')
+    return len(sent), failed
@@ -0,0 +1,91 @@
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from . import outbox
+from .models import OutgoingEmail
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP server is not responding')
+
+
+class UnreachableBackend(FailingBackend):
+    """
+    Backend losing the server after the first connection
+    """
+    opened = 0
+
+    def open(self):
+        self.opened += 1
+        if self.opened > 1:
+            raise ConnectionRefusedError('Connection refused')
+
+
+def email(number):
+    message = EmailMultiAlternatives(f'Subject {number}', 'Text', 'admin@example.com', [f'user{number}@example.com'],
+                                     headers={'Reply-To': 'admin@example.com'})
+    message.attach_alternative('<p>Text</p>', 'text/html')
+    return message
+
+
+class OutboxTest(TestCase):
+    def test_queued_emails_are_sent_in_batches(self):
+        outbox.enqueue([email(number) for number in range(3)])
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(outbox.send_queued(batch_size=2), (2, 0))
+        self.assertEqual(outbox.send_queued(batch_size=2), (1, 0))
+        self.assertEqual(outbox.send_queued(batch_size=2), (0, 0))
+        self.assertEqual([message.to for message in mail.outbox], [[f'user{number}@example.com'] for number in range(3)])
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>Text</p>', 'text/html')])
+        self.assertEqual(mail.outbox[0].extra_headers, {'Reply-To': 'admin@example.com'})
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 3)
+
+    def test_rate_limit_is_respected(self):
+        outbox.enqueue([email(number) for number in range(3)])
+        with mock.patch.object(outbox, 'MAILING_RATE_LIMIT', 2):
+            self.assertEqual(outbox.send_queued(), (2, 0))
+            self.assertEqual(outbox.send_queued(), (0, 0))
+
+    def test_failed_email_is_retried_with_backoff_and_dead_lettered(self):
+        outbox.enqueue([email(0)])
+        entry = OutgoingEmail.objects.get()
+        with mock.patch.object(outbox, 'MAILING_MAX_ATTEMPTS', 3):
+            delays = []
+            for _ in range(3):
+                OutgoingEmail.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now())
+                before = timezone.now()
+                self.assertEqual(outbox.send_queued(connection=FailingBackend()), (0, 1))
+                entry.refresh_from_db()
+                delays.append(round((entry.next_attempt_at - before).total_seconds() / outbox.MAILING_RETRY_DELAY))
+
+        self.assertEqual(delays[:2], [1, 2])
+        self.assertEqual(entry.status, OutgoingEmail.DEAD)
+        self.assertIn('SMTP server is not responding', entry.last_error)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_remaining_emails_are_retried_when_server_is_lost(self):
+        outbox.enqueue([email(number) for number in range(3)])
+        self.assertEqual(outbox.send_queued(connection=UnreachableBackend()), (0, 3))
+        errors = sorted(OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING, attempts=1)
+                        .values_list('last_error', flat=True))
+        self.assertEqual(errors, ['ConnectionError: SMTP server is not responding'] +
+                         ['ConnectionRefusedError: Connection refused'] * 2)
+
+    def test_worker_keeps_running_after_error(self):
+        with mock.patch('mailing.management.commands.send_queued_emails.send_queued',
+                        side_effect=[RuntimeError('database is locked'), (1, 0), KeyboardInterrupt]), \
+                mock.patch('mailing.management.commands.send_queued_emails.time.sleep') as sleep, \
+                self.assertLogs('mailing.management.commands.send_queued_emails', 'ERROR'):
+            stdout = StringIO()
+            call_command('send_queued_emails', loop=True, stdout=stdout)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertIn('Sent 1 emails, 0 failed', stdout.getvalue())
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MessagesConfig(AppConfig):
     name = 'messaging'
+
+    def ready(self):
+        import messaging.checks
+        import messaging.signals
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models import Max
+
+from papers.models import ArchivedConversation, Message, MessageReadCursor
+
+
+def archive_conversation(paper_id, reviewer_id):
+    """
+    Moves all messages of the conversation from Message table to a new ArchivedConversation,
+    read cursors of the conversation are removed, archived messages are never unread
+    :param paper_id: integer
+    :param reviewer_id: integer
+    :return: integer (number of archived messages)
+    """
+    with transaction.atomic():
+        messages = list(Message.objects.select_for_update().filter(paper=paper_id, reviewer=reviewer_id)
+                        .select_related('author').order_by('pk'))
+        if not messages:
+            return 0
+        ArchivedConversation.objects.create(
+            paper_id=paper_id,
+            reviewer_id=reviewer_id,
+            first_message_id=messages[0].pk,
+            last_message_id=messages[-1].pk,
+            messages_count=len(messages),
+            data=ArchivedConversation.pack(messages),
+        )
+        # deleting through the queryset removes messages from the search index as well
+        Message.objects.filter(pk__in=[message.pk for message in messages]).delete()
+        MessageReadCursor.objects.filter(paper=paper_id, reviewer=reviewer_id).delete()
+    return len(messages)
+
+
+def conversations_to_archive(papers, before):
+    """
+    Finds conversations of given papers in which nothing was written since the cutoff
+    :param papers: Paper queryset
+    :param before: datetime (cutoff)
+    :return: queryset of dicts with paper and reviewer
+    """
+    return Message.objects.filter(paper__in=papers.values('pk')).values('paper', 'reviewer') \
+        .annotate(newest=Max('created_at')).filter(newest__lt=before).order_by('paper', 'reviewer')
+
+
+def load_archived_messages(paper, reviewer, before_id=None, limit=None):
+    """
+    Loads archived messages of the conversation, newest first
+    :param paper: Paper object or id
+    :param reviewer: User object or id
+    :param before_id: integer (if given, only messages with lower id are returned)
+    :param limit: integer (maximal number of returned messages)
+    :return: list of unsaved Message objects ordered by id descending
+    """
+    archives = ArchivedConversation.objects.filter(paper=paper, reviewer=reviewer).order_by('-last_message_id')
+    if before_id is not None:
+        archives = archives.filter(first_message_id__lt=before_id)
+
+    messages = []
+    # archives are decompressed one at a time, only as many as needed to fill the page
+    for archive in archives.iterator():
+        messages.extend(message for message in reversed(archive.unpack())
+                        if before_id is None or message.pk < before_id)
+        if limit is not None and len(messages) >= limit:
+            return messages[:limit]
+    return messages
+
+
+def newest_archived_message_id(paper, reviewer):
+    return ArchivedConversation.objects.filter(paper=paper, reviewer=reviewer) \
+        .aggregate(newest=Max('last_message_id'))['newest']
@@ -0,0 +1,85 @@
+from django.core.cache import cache
+
+from StronaProjektyKol.settings import MESSAGING_WATERMARK_TIMEOUT, MESSAGING_ACCESS_CACHE_TIMEOUT, \
+    MESSAGING_UNREAD_CACHE_TIMEOUT
+from papers.models import Message
+
+WATERMARK_KEY = 'messaging:watermark:{paper_id}:{reviewer_id}'
+ACCESS_KEY = 'messaging:access:{session_key}:{paper_id}:{reviewer_id}'
+UNREAD_KEY = 'messaging:unread:{user_id}'
+
+
+def get_watermark(paper_id, reviewer_id):
+    """
+    Returns id of the newest message of the conversation
+    :param paper_id: integer
+    :param reviewer_id: integer
+    :return: integer or None if it is not known
+    """
+    return cache.get(WATERMARK_KEY.format(paper_id=paper_id, reviewer_id=reviewer_id))
+
+
+def set_watermark(paper_id, reviewer_id, message_id):
+    cache.set(WATERMARK_KEY.format(paper_id=paper_id, reviewer_id=reviewer_id), message_id,
+              MESSAGING_WATERMARK_TIMEOUT)
+
+
+def init_watermark(paper_id, reviewer_id, message_id):
+    """
+    Stores watermark computed from the database only if it is missing,
+    so it can't overwrite newer value set by a concurrently sent message
+    """
+    cache.add(WATERMARK_KEY.format(paper_id=paper_id, reviewer_id=reviewer_id), message_id,
+              MESSAGING_WATERMARK_TIMEOUT)
+
+
+def has_access_grant(session_key, paper_id, reviewer_id):
+    """
+    Checks if access to the conversation was recently confirmed for the session
+    :param session_key: string (session cookie) or None
+    :param paper_id: integer
+    :param reviewer_id: integer
+    :return: boolean
+    """
+    if not session_key:
+        return False
+    return cache.get(ACCESS_KEY.format(session_key=session_key, paper_id=paper_id, reviewer_id=reviewer_id)) is not None
+
+
+def grant_access(session_key, paper_id, reviewer_id):
+    if session_key:
+        cache.set(ACCESS_KEY.format(session_key=session_key, paper_id=paper_id, reviewer_id=reviewer_id), True,
+                  MESSAGING_ACCESS_CACHE_TIMEOUT)
+
+
+def get_unread_total(user):
+    """
+    Returns number of unread messages in all conversations of the user (as paper's author or as the reviewer),
+    counter is kept in cache and computed only when missing
+    :param user: User object
+    :return: integer
+    """
+    if not user.is_authenticated:
+        return 0
+
+    def count():
+        return Message.objects.of_participant(user).unread_by(user).count()
+
+    return cache.get_or_set(UNREAD_KEY.format(user_id=user.pk), count, MESSAGING_UNREAD_CACHE_TIMEOUT)
+
+
+def increment_unread_totals(user_ids):
+    """
+    Increments counters of users who received a new message, missing counters are computed later
+    :param user_ids: iterable of integers
+    :return:
+    """
+    for user_id in user_ids:
+        try:
+            cache.incr(UNREAD_KEY.format(user_id=user_id))
+        except ValueError:
+            pass
+
+
+def invalidate_unread_total(user_id):
+    cache.delete(UNREAD_KEY.format(user_id=user_id))
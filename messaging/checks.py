@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warns when the default cache isn't shared between processes, conversation watermarks, unread counters
+    and other invalidated entries would be stale in processes other than the one handling the change
+    """
+    if settings.CACHES['default']['BACKEND'] == LOCAL_CACHE_BACKEND:
+        return [Warning('Default cache is not shared between server processes.',
+                        hint='Use Memcached or Redis cache when the site is served by more than one process.',
+                        id='messaging.W001')]
+    return []
@@ -0,0 +1,10 @@
+from .cache import get_unread_total
+
+
+def unread_messages(request):
+    """
+    Adds total number of user's unread messages to the context, it is read from cache only when used by the template
+    :param request:
+    :return: dict
+    """
+    return {'unread_messages_total': lambda: get_unread_total(request.user)}
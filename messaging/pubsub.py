@@ -0,0 +1,128 @@
+import abc
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.utils.module_loading import import_string
+
+from StronaProjektyKol.settings import MESSAGING_PUBSUB_BACKEND
+
+
+def conversation_channel(paper_id, reviewer_id):
+    """
+    Returns name of the channel used for messages of the conversation between paper's authors and a reviewer
+    :param paper_id: integer
+    :param reviewer_id: integer
+    :return: string
+    """
+    return f'messages:{paper_id}:{reviewer_id}'
+
+
+class Hub:
+    """
+    In-process registry of stream subscribers, every subscriber gets its own asyncio queue
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """
+        Registers new subscriber of the channel, must be called from the event loop serving the stream
+        :param channel: string
+        :return: asyncio.Queue receiving published data
+        """
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers[channel].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.difference_update({item for item in subscribers if item[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def deliver(self, channel, data):
+        """
+        Passes data to all local subscribers of the channel, can be called from any thread
+        :param channel: string
+        :param data: string
+        :return:
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, data)
+            except RuntimeError:
+                # event loop of the subscriber is already closed
+                self.unsubscribe(channel, queue)
+
+
+hub = Hub()
+
+
+class BaseBackend(abc.ABC):
+    """
+    Delivers published data to hubs of all processes serving streams.
+    Cross-process backend (e.g. Redis pub/sub or PostgreSQL LISTEN/NOTIFY) should send data to the broker
+    in publish() and pass everything it receives from the broker to hub.deliver() in every process,
+    start() is called once per process before the first subscription.
+    """
+
+    def start(self):
+        pass
+
+    @abc.abstractmethod
+    def publish(self, channel, data):
+        """
+        Sends data to subscribers of the channel in all processes
+        :param channel: string
+        :param data: string
+        :return:
+        """
+
+
+class LocalBackend(BaseBackend):
+    """
+    Stand-in for a cross-process broker, data reaches only subscribers in the publishing process,
+    so it is enough only when the site is served by a single ASGI process
+    """
+
+    def publish(self, channel, data):
+        hub.deliver(channel, data)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(MESSAGING_PUBSUB_BACKEND)()
+            _backend.start()
+    return _backend
+
+
+def publish(channel, data):
+    """
+    Publishes data to subscribers of the channel in all processes
+    :param channel: string
+    :param data: string (JSON)
+    :return:
+    """
+    get_backend().publish(channel, data)
+
+
+def subscribe(channel):
+    get_backend()
+    return hub.subscribe(channel)
+
+
+def unsubscribe(channel, queue):
+    hub.unsubscribe(channel, queue)
@@ -0,0 +1,194 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from StronaProjektyKol.settings import MESSAGING_SEARCH_PAGE_SIZE
+from papers import search
+from papers.models import fold_name, Message
+from papers.permissions import papers_with_message_access
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+SNIPPET_LENGTH = 160
+
+
+class SQLiteMessageSearchBackend(search.SQLiteSearchBackend):
+    """
+    FTS5 index of messages' text, rowid of the table is message's id
+    """
+    table = 'papers_message_fts'
+
+    def create(self, cursor):
+        cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+                       f'USING fts5(text, tokenize="unicode61 remove_diacritics 2")')
+
+    def update(self, cursor, pk, text):
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+        cursor.execute(f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)', [pk, fold_name(text)])
+
+    def page_sql(self, terms, paper_ids):
+        sql = (f'SELECT {self.table}.rowid FROM {self.table} '
+               f'JOIN papers_message ON papers_message.id = {self.table}.rowid WHERE {self.table} MATCH %s')
+        params = [self.match_query(terms)]
+        if paper_ids is not None:
+            sql += f' AND papers_message.paper_id IN ({", ".join(["%s"] * len(paper_ids))})'
+            params += paper_ids
+        return f'{sql} ORDER BY {self.table}.rowid DESC LIMIT %s OFFSET %s', params
+
+
+class PostgreSQLMessageSearchBackend(search.PostgreSQLSearchBackend):
+    """
+    Messages' text stored as tsvector with GIN index
+    """
+    table = 'papers_message_search'
+
+    def create(self, cursor):
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                       f'message_id integer PRIMARY KEY REFERENCES papers_message (id) ON DELETE CASCADE, '
+                       f'document tsvector NOT NULL)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_document_gin ON {self.table} USING GIN (document)')
+
+    def update(self, cursor, pk, text):
+        cursor.execute(f"INSERT INTO {self.table} (message_id, document) VALUES (%s, to_tsvector('simple', %s)) "
+                       f'ON CONFLICT (message_id) DO UPDATE SET document = EXCLUDED.document',
+                       [pk, fold_name(text)])
+
+    def remove(self, cursor, pk):
+        cursor.execute(f'DELETE FROM {self.table} WHERE message_id = %s', [pk])
+
+    def page_sql(self, terms, paper_ids):
+        sql = (f'SELECT message_id FROM {self.table} JOIN papers_message ON papers_message.id = message_id '
+               f"WHERE document @@ to_tsquery('simple', %s)")
+        params = [self.match_query(terms)]
+        if paper_ids is not None:
+            sql += ' AND papers_message.paper_id = ANY(%s)'
+            params.append(paper_ids)
+        return f'{sql} ORDER BY message_id DESC LIMIT %s OFFSET %s', params
+
+
+BACKENDS = {
+    'sqlite': SQLiteMessageSearchBackend,
+    'postgresql': PostgreSQLMessageSearchBackend,
+}
+
+
+def get_backend(conn=None):
+    """
+    Returns messages search backend for the database vendor or None if full text search is not supported
+    :param conn: database connection (default connection if not given)
+    :return: backend object or None
+    """
+    backend = BACKENDS.get((conn or connection).vendor)
+    return backend() if backend is not None else None
+
+
+def index_message(message):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.update(cursor, message.pk, message.text)
+
+
+def unindex_message(pk):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, pk)
+
+
+def rebuild_index(messages):
+    """
+    Removes all entries from the messages search index and indexes given messages again
+    :param messages: Message queryset
+    :return: integer (number of indexed messages)
+    """
+    backend = get_backend()
+    if backend is None:
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        for pk, text in messages.values_list('pk', 'text').iterator():
+            backend.update(cursor, pk, text)
+            count += 1
+    return count
+
+
+def search_messages(user, query, page=1, paper_id=None):
+    """
+    Finds messages matching the query in conversations the user has access to, newest first
+    :param user: User object
+    :param query: string
+    :param page: integer (number of the page, starting from 1)
+    :param paper_id: integer (if given, only conversations of this paper are searched)
+    :return: tuple (list of Message objects, boolean telling if there is a next page)
+    """
+    terms = search.search_terms(query)
+    if not terms or not user.is_authenticated:
+        return [], False
+
+    messages = Message.objects.all()
+    paper_ids = None
+    if not user.is_staff or paper_id is not None:
+        # conversations of a user belong to a handful of papers, their ids are loaded first
+        papers = papers_with_message_access(user)
+        if paper_id is not None:
+            papers = papers.filter(pk=paper_id)
+        paper_ids = list(papers.values_list('pk', flat=True))
+        if not paper_ids:
+            return [], False
+        messages = messages.filter(paper__in=paper_ids)
+
+    offset = (page - 1) * MESSAGING_SEARCH_PAGE_SIZE
+    backend = get_backend()
+    if backend is None:
+        for term in terms:
+            messages = messages.filter(text__icontains=term)
+        ids = list(messages.order_by('-pk').values_list('pk', flat=True)[offset:offset + MESSAGING_SEARCH_PAGE_SIZE + 1])
+    else:
+        sql, params = backend.page_sql(terms, paper_ids)
+        with connection.cursor() as cursor:
+            # one more row is loaded only to know if there is a next page
+            cursor.execute(sql, params + [MESSAGING_SEARCH_PAGE_SIZE + 1, offset])
+            ids = [row[0] for row in cursor.fetchall()]
+
+    has_next = len(ids) > MESSAGING_SEARCH_PAGE_SIZE
+    ids = ids[:MESSAGING_SEARCH_PAGE_SIZE]
+    messages = Message.objects.select_related('author', 'paper', 'reviewer').in_bulk(ids)
+    return [messages[pk] for pk in ids if pk in messages], has_next
+
+
+def highlight(text, query, length=SNIPPET_LENGTH):
+    """
+    Returns escaped fragment of the text around the first match with matching words marked,
+    words are compared after folding, so 'zolw' marks 'Żółw'
+    :param text: string
+    :param query: string (user's query)
+    :param length: integer (approximate length of the fragment)
+    :return: string (HTML)
+    """
+    terms = search.search_terms(query)
+    matches = [match for match in WORD_RE.finditer(text)
+               if any(fold_name(match.group()).startswith(term) for term in terms)]
+
+    start = max(0, matches[0].start() - length // 3) if matches else 0
+    end = min(len(text), start + length)
+    if start > 0:
+        # fragment should not begin in the middle of a word
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < matches[0].start() else start
+
+    parts = ['…'] if start > 0 else []
+    position = start
+    for match in matches:
+        if match.start() < start:
+            continue
+        if match.end() > end:
+            break
+        parts.append(escape(text[position:match.start()]))
+        parts.append(f'<mark>{escape(match.group())}</mark>')
+        position = match.end()
+    parts.append(escape(text[position:end]))
+    if end < len(text):
+        parts.append('…')
+    return ''.join(parts)
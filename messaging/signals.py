@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from papers.models import Message
+from . import search
+from .cache import set_watermark
+
+
+@receiver(post_save, sender=Message)
+def index_message_text(sender, instance, **kwargs):
+    """
+    Updates full text search index entry of the saved message
+    :param sender: Message class
+    :param instance: Message object that was saved
+    :param kwargs:
+    :return:
+    """
+    search.index_message(instance)
+
+
+@receiver(post_delete, sender=Message)
+def unindex_message_text(sender, instance, **kwargs):
+    search.unindex_message(instance.pk)
+
+
+@receiver(post_save, sender=Message)
+def update_conversation_watermark(sender, instance, created, **kwargs):
+    """
+    Moves watermark of the conversation to the new message, also when it was not sent by send_message (e.g. admin panel),
+    so pollers stop getting 304 as soon as the message is visible for them
+    :param sender: Message class
+    :param instance: Message object that was saved
+    :param created: boolean
+    :param kwargs:
+    :return:
+    """
+    if created:
+        transaction.on_commit(lambda: set_watermark(instance.paper_id, instance.reviewer_id, instance.pk))
@@ -5,6 +5,10 @@ let LastMessageId = -1;
 let OwnMessageHTML = '';
 let ForeignMessageHTML = '';
 let CanGetMessage = true;
+let MessageStream = null;
+let OlderMessagesId = null;
+let LoadingOlderMessages = false;
+let StreamAvailable = typeof EventSource !== 'undefined' && typeof stream_messages_url !== 'undefined';
 
 function SendMessage() {
     $.post(send_message_url,
@@ -15,7 +19,9 @@ function SendMessage() {
         },
         function (data, status) {
             if (status == 'success') {
-                GetMessage();
+                if (MessageStream === null) {
+                    GetMessage();
+                }
                 $('#input_message').val('');
                 last_message = 0;
             }
@@ -23,7 +29,7 @@ function SendMessage() {
 }
 
 
-function GetMessage() {
+function GetMessage(callback) {
     if (CanGetMessage == false)
         return;
 
@@ -36,7 +42,12 @@ function GetMessage() {
         },
         function (data, status) {
             if (status == 'success') {
-                let temporary = Object.values(data);
+                if (LastMessageId < 0) {
+                    // conversation was just opened, older messages are loaded when the history is scrolled up
+                    OlderMessagesId = data.older;
+                }
+                // messages could be already received from the stream
+                let temporary = data.messages.filter(item => parseInt(item.id) > LastMessageId);
                 let array_len = temporary.length;
                 if (array_len > 0) {
                     let last_message = temporary[array_len - 1];
@@ -46,24 +57,89 @@ function GetMessage() {
                 }
             }
             CanGetMessage = true;
+            if (typeof callback === 'function') {
+                callback();
+            }
+        });
+}
+
+function LoadOlderMessages() {
+    if (OlderMessagesId === null || LoadingOlderMessages)
+        return;
+
+    LoadingOlderMessages = true;
+    let reviewer = ReviewerId;
+    $.post(get_messages_url,
+        {
+            paper_id: PaperId,
+            reviewer_id: ReviewerId,
+            before_id: OlderMessagesId,
+        },
+        function (data, status) {
+            LoadingOlderMessages = false;
+            // conversation could be changed in the meantime
+            if (status != 'success' || reviewer != ReviewerId)
+                return;
+
+            let div = document.getElementById('messages_box');
+            let previousHeight = div.scrollHeight;
+            $("#messages_box").prepend(data.messages.map(MessageHTML).join(''));
+            // keep the message that was on the top in place
+            div.scrollTop += div.scrollHeight - previousHeight;
+            OlderMessagesId = data.older;
         });
 }
 
+function PollMessages() {
+    // polling is used only when the stream is not available
+    if (MessageStream === null) {
+        GetMessage();
+    }
+}
+
+function OpenMessageStream() {
+    CloseMessageStream();
+    if (!StreamAvailable) {
+        return;
+    }
+
+    MessageStream = new EventSource(stream_messages_url + '?' + $.param({
+        paper_id: PaperId,
+        reviewer_id: ReviewerId,
+        last_message_id: LastMessageId,
+    }));
+
+    MessageStream.onmessage = function (event) {
+        let item = JSON.parse(event.data);
+        if (parseInt(item.id) > LastMessageId) {
+            LastMessageId = parseInt(item.id);
+            MessagesArray.push(item);
+            RenderMessages();
+        }
+    };
+
+    MessageStream.onerror = function () {
+        // browser reconnects by itself after network errors, closed stream means it is not served at all
+        if (MessageStream !== null && MessageStream.readyState === EventSource.CLOSED) {
+            StreamAvailable = false;
+            CloseMessageStream();
+        }
+    };
+}
+
+function CloseMessageStream() {
+    if (MessageStream !== null) {
+        MessageStream.close();
+        MessageStream = null;
+    }
+}
+
 function RenderMessages() {
-    let tmpStr = '';
     let div = document.getElementById('messages_box');
     let scroll = div.scrollHeight - Math.abs(div.scrollTop) === div.clientHeight;
 
     MessagesArray.forEach(function (item, index, array) {
-        if (item.author == Username) {
-            tmpStr = OwnMessageHTML;
-        } else {
-            tmpStr = ForeignMessageHTML;
-        }
-        tmpStr = tmpStr.replace('[author]', item.author_name);
-        tmpStr = tmpStr.replace('[text]', item.text);
-        tmpStr = tmpStr.replace('[date]', item.date);
-        $("#messages_box").append(tmpStr);
+        $("#messages_box").append(MessageHTML(item));
     });
 
 
@@ -73,6 +149,56 @@ function RenderMessages() {
     MessagesArray = [];
 }
 
+function MessageHTML(item) {
+    let tmpStr = '';
+    if (item.author == Username) {
+        tmpStr = OwnMessageHTML;
+    } else {
+        tmpStr = ForeignMessageHTML;
+    }
+    tmpStr = tmpStr.replace('[author]', item.author_name);
+    tmpStr = tmpStr.replace('[text]', item.text);
+    tmpStr = tmpStr.replace('[date]', item.date);
+    return tmpStr;
+}
+
+let SearchQuery = '';
+let SearchPage = 1;
+
+function SearchMessages(page) {
+    if (SearchQuery.length == 0)
+        return;
+
+    $.get(search_messages_url,
+        {
+            q: SearchQuery,
+            page: page,
+            paper_id: PaperId,
+        },
+        function (data, status) {
+            if (status != 'success')
+                return;
+
+            let list = $('#search_messages_results ul');
+            if (page == 1) {
+                list.html('');
+            }
+            data.results.forEach(function (item) {
+                // snippet is escaped on the server, only matches are marked
+                list.append($('<li class="list-group-item">')
+                    .append($('<small class="text-muted d-block">')
+                        .text(item.author_name + ' (' + item.reviewer_name + '), ' + item.date))
+                    .append($('<span>').html(item.snippet)));
+            });
+            if (page == 1 && data.results.length == 0) {
+                list.append($('<li class="list-group-item">').text('Brak wyników'));
+            }
+            SearchPage = data.page;
+            $('#search_messages_more').prop('hidden', !data.has_next);
+            $('#search_messages_results').prop('hidden', false);
+        });
+}
+
 function scrollSmoothToBottom(id) {
     let div = document.getElementById(id);
     $('#' + id).animate({
@@ -82,6 +208,21 @@ function scrollSmoothToBottom(id) {
 
 $().ready(function () {
 
+    $("#search_messages_button").click(function () {
+        SearchQuery = $('#search_messages_input').val().trim();
+        SearchMessages(1);
+    });
+
+    $("#search_messages_more").click(function () {
+        SearchMessages(SearchPage + 1);
+    });
+
+    $("#messages_box").on('scroll', function () {
+        if (this.scrollTop === 0) {
+            LoadOlderMessages();
+        }
+    });
+
     $("#send_message_button").click(function () {
         if ($('#input_message').val().length > 0) {
             SendMessage();
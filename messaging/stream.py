@@ -0,0 +1,178 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from StronaProjektyKol.settings import MESSAGING_STREAM_KEEPALIVE, MESSAGING_STREAM_TIMEOUT
+from papers.models import Message
+from . import pubsub
+from .views import get_paper, has_user_access_to_messages, serialize_message, mark_messages_seen, \
+    get_conversation_page
+
+EVENT_STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def database_sync_to_async(func):
+    """
+    Runs function using database in a worker thread, connections are cleaned up like after a request
+    """
+
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper)
+
+
+class _SessionRequest:
+    """
+    Minimal request object needed by django.contrib.auth.get_user
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+
+def _parse_cookies(scope):
+    cookies = {}
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            for item in value.decode('latin1').split(';'):
+                key, _, morsel = item.strip().partition('=')
+                cookies[key] = morsel
+    return cookies
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin1')
+    return None
+
+
+@database_sync_to_async
+def open_conversation(session_key, paper_id, reviewer_id, last_message_id):
+    """
+    Checks access to the conversation and loads messages newer than last_message_id
+    :return: tuple (user, list of serialized messages) or (None, None) if access is denied
+    """
+    session = import_string(f'{settings.SESSION_ENGINE}.SessionStore')(session_key)
+    user = get_user(_SessionRequest(session))
+    paper = get_paper(user, paper_id)
+    if not has_user_access_to_messages(user, paper) or not paper.reviewers.filter(pk=reviewer_id).exists():
+        return None, None
+    messages = get_conversation_page(paper, reviewer_id, last_message_id=last_message_id)[0]
+    mark_messages_seen(messages, user)
+    return user, [serialize_message(message) for message in messages]
+
+
+@database_sync_to_async
+def mark_seen(message_ids, user):
+    mark_messages_seen(Message.objects.filter(pk__in=message_ids), user)
+
+
+def _event(message):
+    return f'id: {message["id"]}\ndata: {json.dumps(message)}\n\n'.encode('utf-8')
+
+
+class MessageStreamApplication:
+    """
+    ASGI application serving Server-Sent Events stream of conversation messages,
+    every other request is passed to the Django application.
+    Stream is served here and not by a Django view, because Django iterates streaming responses
+    synchronously, which would block the event loop for the whole lifetime of the connection.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self._path = None
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = reverse('stream_messages')
+        return self._path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            await self.stream(scope, receive, send)
+        else:
+            await self.application(scope, receive, send)
+
+    async def stream(self, scope, receive, send):
+        params = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        try:
+            paper_id = int(params['paper_id'])
+            reviewer_id = int(params['reviewer_id'])
+            # browser sends id of the last received event when it reconnects
+            last_message_id = max(int(params.get('last_message_id', -1)), int(_header(scope, b'last-event-id') or -1))
+        except (KeyError, ValueError):
+            await self.reject(send, 400)
+            return
+
+        channel = pubsub.conversation_channel(paper_id, reviewer_id)
+        # subscribe before loading messages, so nothing sent in between is lost
+        queue = pubsub.subscribe(channel)
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            session_key = _parse_cookies(scope).get(settings.SESSION_COOKIE_NAME)
+            user, messages = await open_conversation(session_key, paper_id, reviewer_id, last_message_id)
+            if user is None:
+                await self.reject(send, 401)
+                return
+
+            await send({'type': 'http.response.start', 'status': 200, 'headers': EVENT_STREAM_HEADERS})
+            for message in messages:
+                last_message_id = max(last_message_id, int(message['id']))
+                await send({'type': 'http.response.body', 'body': _event(message), 'more_body': True})
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + MESSAGING_STREAM_TIMEOUT
+            while not disconnected.done() and loop.time() < deadline:
+                received = asyncio.ensure_future(queue.get())
+                await asyncio.wait({received, disconnected}, timeout=MESSAGING_STREAM_KEEPALIVE,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not received.done():
+                    received.cancel()
+                    if not disconnected.done():
+                        await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                    continue
+                message = json.loads(received.result())
+                if int(message['id']) <= last_message_id:
+                    continue
+                last_message_id = int(message['id'])
+                await send({'type': 'http.response.body', 'body': _event(message), 'more_body': True})
+                if message['author'] != user.username:
+                    await mark_seen([last_message_id], user)
+
+            # connection is closed from time to time, browser reconnects with the id of the last event
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            pubsub.unsubscribe(channel, queue)
+            disconnected.cancel()
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    @staticmethod
+    async def reject(send, status):
+        await send({'type': 'http.response.start', 'status': status, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
@@ -1 +1,195 @@
-# Create your tests here.
+import asyncio
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from papers.models import Paper, Message
+from . import archive, pubsub
+from . import views
+
+
+class MessagePublishTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+
+    def test_sent_message_is_published_after_commit(self):
+        channel = pubsub.conversation_channel(self.paper.pk, self.reviewer.pk)
+        self.client.force_login(self.author)
+
+        async def subscribe():
+            return pubsub.subscribe(channel)
+
+        loop = asyncio.new_event_loop()
+        queue = loop.run_until_complete(subscribe())
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('send_message'), {'paper_id': self.paper.pk,
+                                                           'reviewer_id': self.reviewer.pk,
+                                                           'message_text': 'Dzień dobry'})
+                loop.run_until_complete(asyncio.sleep(0))
+                self.assertTrue(queue.empty())
+            message = json.loads(loop.run_until_complete(asyncio.wait_for(queue.get(), 1)))
+        finally:
+            pubsub.unsubscribe(channel, queue)
+            loop.close()
+
+        self.assertEqual(message['text'], 'Dzień dobry')
+        self.assertEqual(message['author'], 'author')
+
+    def test_backend_must_implement_publish(self):
+        class IncompleteBackend(pubsub.BaseBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteBackend()
+
+
+class GetMessageFastPathTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+        self.client.force_login(self.author)
+
+    def poll(self, last_message_id):
+        return self.client.post(reverse('get_messages'), {'paper_id': self.paper.pk, 'reviewer_id': self.reviewer.pk,
+                                                          'last_message_id': last_message_id})
+
+    def test_poll_without_new_messages_skips_database(self):
+        self.assertEqual(self.poll(-1).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('send_message'), {'paper_id': self.paper.pk, 'reviewer_id': self.reviewer.pk,
+                                                       'message_text': 'Dzień dobry'})
+        message_id = int(self.poll(-1).json()['messages'][0]['id'])
+
+        # neither the session nor the user is loaded
+        with self.assertNumQueries(0):
+            self.assertEqual(self.poll(message_id).status_code, 304)
+
+    def test_message_created_outside_of_view_ends_fast_path(self):
+        self.assertEqual(self.poll(-1).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(author=self.reviewer, paper=self.paper, reviewer=self.reviewer,
+                                             text='Dzień dobry')
+        self.assertEqual(self.poll(message.pk).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = Message.objects.create(author=self.reviewer, paper=self.paper, reviewer=self.reviewer,
+                                           text='Proszę o poprawki')
+        response = self.poll(message.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()['messages']], [str(newer.pk)])
+
+    def test_poll_of_other_session_is_not_short_circuited(self):
+        self.poll(-1)
+        self.client.logout()
+        self.assertEqual(self.poll(-1).status_code, 401)
+
+
+class MessageHistoryTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+        self.messages = [Message.objects.create(author=self.reviewer, paper=self.paper, reviewer=self.reviewer,
+                                                text=str(i)) for i in range(5)]
+        self.client.force_login(self.author)
+
+    def fetch(self, **data):
+        data.update({'paper_id': self.paper.pk, 'reviewer_id': self.reviewer.pk})
+        response = self.client.post(reverse('get_messages'), data).json()
+        return [int(message['id']) for message in response['messages']], response['older']
+
+    def test_history_is_loaded_backwards_in_pages(self):
+        ids = [message.pk for message in self.messages]
+        with mock.patch.object(views, 'MESSAGING_HISTORY_PAGE_SIZE', 2):
+            self.assertEqual(self.fetch(last_message_id=-1), (ids[3:], ids[3]))
+            self.assertEqual(self.fetch(before_id=ids[3]), (ids[1:3], ids[1]))
+            self.assertEqual(self.fetch(before_id=ids[1]), (ids[:1], None))
+            self.assertEqual(self.fetch(last_message_id=ids[2]), (ids[3:], None))
+
+    def test_archived_history_is_readable(self):
+        ids = [message.pk for message in self.messages]
+        self.assertEqual(archive.archive_conversation(self.paper.pk, self.reviewer.pk), 5)
+        self.assertFalse(Message.objects.exists())
+        new = Message.objects.create(author=self.author, paper=self.paper, reviewer=self.reviewer, text='new')
+        with mock.patch.object(views, 'MESSAGING_HISTORY_PAGE_SIZE', 2):
+            self.assertEqual(self.fetch(last_message_id=-1), ([ids[4], new.pk], ids[4]))
+            self.assertEqual(self.fetch(before_id=ids[4]), (ids[2:4], ids[2]))
+            self.assertEqual(self.fetch(before_id=ids[2]), (ids[:2], None))
+
+
+class UnreadMessagesCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+
+    def unread(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('unread_messages_count')).json()['unread']
+
+    def test_counter_follows_sent_and_read_messages(self):
+        self.assertEqual(self.unread(self.author), 0)
+        self.client.force_login(self.reviewer)
+        with self.captureOnCommitCallbacks(execute=True):
+            for text in ('Dzień dobry', 'Proszę o poprawki'):
+                self.client.post(reverse('send_message'), {'paper_id': self.paper.pk, 'reviewer_id': self.reviewer.pk,
+                                                           'message_text': text})
+        self.assertEqual(self.unread(self.reviewer), 0)
+        self.assertEqual(self.unread(self.author), 2)
+        # counter is served from cache
+        with self.assertNumQueries(0):
+            self.assertEqual(views.get_unread_total(self.author), 2)
+
+        self.client.post(reverse('get_messages'), {'paper_id': self.paper.pk, 'reviewer_id': self.reviewer.pk,
+                                                   'last_message_id': -1})
+        self.assertEqual(self.unread(self.author), 0)
+
+    def test_counter_and_papers_badges_count_the_same_conversations(self):
+        other_reviewer = User.objects.create(username='other_reviewer')
+        self.paper.reviewers.add(other_reviewer)
+        # conversation of the other reviewer is not unread for this reviewer
+        Message.objects.create(author=self.author, paper=self.paper, reviewer=other_reviewer, text='Dzień dobry')
+        Message.objects.create(author=self.author, paper=self.paper, reviewer=self.reviewer, text='Dzień dobry')
+
+        self.assertEqual(self.unread(self.reviewer), 1)
+        self.assertEqual(Paper.get_unread_messages_counts([self.paper], self.reviewer), {self.paper.pk: 1})
+        self.assertEqual(len(self.paper.get_unread_messages(self.reviewer)), 1)
+
+
+class MessageSearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.other = User.objects.create(username='other')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+        self.message = Message.objects.create(author=self.reviewer, paper=self.paper, reviewer=self.reviewer,
+                                              text='Proszę poprawić <b>wykres</b> żółwia')
+
+    def search(self, user, query):
+        self.client.force_login(user)
+        return self.client.get(reverse('search_messages'), {'q': query}).json()['results']
+
+    def test_search_is_scoped_and_highlighted(self):
+        results = self.search(self.author, 'zolw')
+        self.assertEqual([result['id'] for result in results], [self.message.pk])
+        self.assertEqual(results[0]['snippet'], 'Proszę poprawić &lt;b&gt;wykres&lt;/b&gt; <mark>żółwia</mark>')
+        self.assertEqual(self.search(self.other, 'zolw'), [])
+
+    def test_deleted_message_is_removed_from_index(self):
+        self.message.delete()
+        self.assertEqual(self.search(self.author, 'wykres'), [])
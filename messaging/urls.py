@@ -1,9 +1,13 @@
 from django.urls import path
 
-from .views import get_message, send_message, render_message
+from .views import get_message, send_message, render_message, stream_message, unread_messages_count, \
+    search_message
 
 urlpatterns = [
     path('get_message/', get_message, name='get_messages'),
     path('send_message/', send_message, name='send_message'),
+    path('stream/', stream_message, name='stream_messages'),
+    path('unread/', unread_messages_count, name='unread_messages_count'),
+    path('search/', search_message, name='search_messages'),
     path('render_message/', render_message, name='render_messages'),
 ]
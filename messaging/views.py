@@ -1,10 +1,20 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Max
+from django.http import HttpResponse, HttpResponseNotModified
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 
-from papers.models import Message, MessageSeen, Paper
+from StronaProjektyKol.settings import MESSAGING_HISTORY_PAGE_SIZE
+from papers.models import Message, MessageReadCursor
+from papers.permissions import can_access_messages, paper_queryset
+from . import archive, pubsub, search
+from .cache import get_watermark, init_watermark, has_access_grant, grant_access, get_unread_total, \
+    increment_unread_totals, invalidate_unread_total
 
 
 @csrf_exempt
@@ -16,65 +26,106 @@ def render_message(request):
 
 @csrf_exempt
 def get_message(request):
+    """
+    Returns messages of the conversation: new messages (with id greater than last_message_id),
+    the latest page when the conversation is opened (last_message_id < 0)
+    or an older page (with id lower than before_id) when the history is scrolled up
+    """
+    paper_id = request.POST['paper_id']
+    reviewer_id = request.POST['reviewer_id']
+    last_message_id = int(request.POST.get('last_message_id', -1))
+    before_id = request.POST.get('before_id')
+
+    # fast path: nothing new since the last poll of a session which already has access to the conversation
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if before_id is None and get_watermark(paper_id, reviewer_id) == last_message_id \
+            and has_access_grant(session_key, paper_id, reviewer_id):
+        return HttpResponseNotModified()
+
     user = request.user
-    paper = Paper.objects.filter(pk=request.POST['paper_id']).first()
+    paper = get_paper(user, paper_id)
 
     if has_user_access_to_messages(user, paper):
-        last_message_id = int(request.POST['last_message_id'])
-        reviewer = User.objects.filter(pk=request.POST['reviewer_id']).first()
+        reviewer = paper.reviewers.filter(pk=reviewer_id).first()
 
-        if reviewer is None or reviewer not in paper.reviewers.all():
+        if reviewer is None:
             response = HttpResponse()
             response.status_code = 401
             return response
 
-        messages = Message.objects.filter(paper=paper, pk__gt=last_message_id, reviewer=reviewer).order_by('created_at')
-
-
-        data = dict()
-        for message in messages:
-            tmp = {'author': f'{message.author.username}',
-                   'author_name': f'{message.author.first_name} {message.author.last_name}',
-                   'date': f'{message.created_at.strftime("%d %b %H:%M")}', 'text': f'{message.text}',
-                   'id': f'{message.id}'}
-            data[message.pk] = tmp
-
-            # add seen record
-            if message.author == user:
-                continue
-
-            if MessageSeen.objects.filter(message=message, reader=user).first() is None:
-                MessageSeen.objects.create(
-                    message=message,
-                    reader=request.user,
-                )
-
-        return JsonResponse(data)
+        if before_id is not None:
+            messages, older = get_conversation_page(paper, reviewer, before_id=int(before_id))
+        else:
+            messages, older = get_conversation_page(paper, reviewer, last_message_id=last_message_id)
+            mark_messages_seen(messages, user)
+
+        grant_access(session_key, paper.pk, reviewer.pk)
+        if get_watermark(paper.pk, reviewer.pk) is None:
+            newest = Message.objects.filter(paper=paper, reviewer=reviewer).aggregate(newest=Max('pk'))['newest']
+            if newest is None:
+                newest = archive.newest_archived_message_id(paper, reviewer)
+            init_watermark(paper.pk, reviewer.pk, newest if newest is not None else -1)
+
+        return JsonResponse({
+            'messages': [serialize_message(message) for message in messages],
+            'older': older,
+        })
     else:
         response = HttpResponse()
         response.status_code = 401
         return response
 
 
+def get_conversation_page(paper, reviewer, last_message_id=-1, before_id=None):
+    """
+    Loads part of the conversation using (paper, reviewer, id) index,
+    history older than messages left in Message table is read from the archive
+    :param paper: Paper object or id
+    :param reviewer: User object or id
+    :param last_message_id: integer (only messages newer than it are returned, negative means the latest page)
+    :param before_id: integer (if given, page of messages older than it is returned)
+    :return: tuple (list of Message objects ordered by id, id to pass as before_id to get older page or None)
+    """
+    messages = Message.objects.filter(paper=paper, reviewer=reviewer).select_related('author')
+    if before_id is None and last_message_id >= 0:
+        return list(messages.filter(pk__gt=last_message_id).order_by('pk')), None
+
+    if before_id is not None:
+        messages = messages.filter(pk__lt=before_id)
+    # one more message is loaded only to know if there is anything older
+    page = list(messages.order_by('-pk')[:MESSAGING_HISTORY_PAGE_SIZE + 1])
+    if len(page) <= MESSAGING_HISTORY_PAGE_SIZE:
+        page += archive.load_archived_messages(paper, reviewer, before_id=page[-1].pk if page else before_id,
+                                               limit=MESSAGING_HISTORY_PAGE_SIZE + 1 - len(page))
+    older = None
+    if len(page) > MESSAGING_HISTORY_PAGE_SIZE:
+        page = page[:MESSAGING_HISTORY_PAGE_SIZE]
+        older = page[-1].pk
+    page.reverse()
+    return page, older
+
+
 @csrf_exempt
 def send_message(request):
     response = HttpResponse()
 
     if request.method == "POST":
         user = request.user
-        paper = Paper.objects.filter(pk=request.POST['paper_id']).first()
+        paper = get_paper(user, request.POST['paper_id'])
         reviewer = User.objects.filter(pk=request.POST['reviewer_id']).first()
 
         if reviewer is None:
             response.status_code = 400
 
         if has_user_access_to_messages(user, paper):
-            Message.objects.create(
+            message = Message.objects.create(
                 author=user,
                 paper=paper,
                 reviewer=reviewer,
                 text=request.POST['message_text'],
             )
+            # subscribers of the conversation stream and pollers get the message only when it is visible for them
+            transaction.on_commit(lambda: publish_message(message))
             response.status_code = 200
         else:
             response.status_code = 400
@@ -84,11 +135,99 @@ def send_message(request):
     return response
 
 
-def has_user_access_to_messages(user, paper):
-    if paper is None or not user.is_authenticated:
-        return False
+def unread_messages_count(request):
+    """
+    Returns total number of unread messages of the logged in user
+    """
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    return JsonResponse({'unread': get_unread_total(request.user)})
+
+
+def search_message(request):
+    """
+    Searches messages of conversations the user has access to,
+    returns a page of results with matching words highlighted
+    """
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    query = request.GET.get('q', '')
+    page = request.GET.get('page', '1')
+    paper_id = request.GET.get('paper_id')
+    page = int(page) if page.isdigit() and int(page) > 0 else 1
+    paper_id = int(paper_id) if paper_id and paper_id.isdigit() else None
+
+    messages, has_next = search.search_messages(request.user, query, page=page, paper_id=paper_id)
+    return JsonResponse({
+        'results': [{
+            'id': message.pk,
+            'paper_id': message.paper_id,
+            'paper_title': message.paper.title,
+            'reviewer_id': message.reviewer_id,
+            'reviewer_name': f'{message.reviewer.first_name} {message.reviewer.last_name}',
+            'author_name': f'{message.author.first_name} {message.author.last_name}',
+            'date': f'{message.created_at.strftime("%d %b %Y %H:%M")}',
+            'snippet': search.highlight(message.text, query),
+        } for message in messages],
+        'page': page,
+        'has_next': has_next,
+    })
+
 
-    if not user.is_staff and user not in paper.reviewers.all() and user != paper.author:
-        return False
+def stream_message(request):
+    """
+    Messages stream is served by the ASGI application (see messaging.stream),
+    this view answers only when the site runs without it, so the client falls back to polling
+    """
+    return HttpResponse(status=503)
+
+
+def serialize_message(message):
+    """
+    Prepares message for sending to the client
+    :param message: Message object (with author loaded)
+    :return: dict
+    """
+    return {'author': f'{message.author.username}',
+            'author_name': f'{message.author.first_name} {message.author.last_name}',
+            'date': f'{message.created_at.strftime("%d %b %H:%M")}', 'text': f'{message.text}',
+            'id': f'{message.id}'}
+
+
+def mark_messages_seen(messages, user):
+    """
+    Moves user's read cursors of conversations forward to the newest of given messages
+    :param messages: iterable of Message objects
+    :param user: User object (reader)
+    :return:
+    """
+    newest = dict()
+    for message in messages:
+        key = (message.paper_id, message.reviewer_id)
+        newest[key] = max(newest.get(key, 0), message.pk)
+    for (paper_id, reviewer_id), message_id in newest.items():
+        MessageReadCursor.advance(user, paper_id, reviewer_id, message_id)
+    if newest:
+        invalidate_unread_total(user.pk)
+
+
+def publish_message(message):
+    increment_unread_totals({message.paper.author_id, message.reviewer_id} - {message.author_id})
+    pubsub.publish(pubsub.conversation_channel(message.paper_id, message.reviewer_id),
+                   json.dumps(serialize_message(message)))
+
+
+def get_paper(user, paper_id):
+    """
+    Fetches paper together with information needed to check access to its messages
+    :param user: User object
+    :param paper_id: id of a paper
+    :return: Paper object or None
+    """
+    if not user.is_authenticated:
+        return None
+    return paper_queryset(user).filter(pk=paper_id).first()
 
-    return True
+
+def has_user_access_to_messages(user, paper):
+    return can_access_messages(user, paper)
@@ -1,12 +1,15 @@
 from django import forms
 from django.contrib import admin, messages
 from django.core.mail import EmailMultiAlternatives, BadHeaderError
-from django.urls import path
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.utils.http import urlencode
 from django.views.generic import FormView
 from django_summernote.admin import SummernoteModelAdmin
 from django_summernote.fields import SummernoteTextFormField
 
-from StronaProjektyKol.settings import SITE_ADMIN_MAIL
+from StronaProjektyKol.settings import SITE_ADMIN_MAIL, MAILING_BCC_CHUNK_SIZE
+from mailing.outbox import enqueue
 from .models import *
 
 
@@ -14,6 +17,19 @@ class AnnouncementAdmin(SummernoteModelAdmin):
     summernote_fields = '__all__'
 
 
+class MessageReadCursorAdmin(admin.ModelAdmin):
+    list_display = ('reader', 'paper', 'reviewer', 'last_read_message_id', 'updated_at')
+    list_select_related = ('reader', 'paper', 'reviewer')
+    raw_id_fields = ('reader', 'paper', 'reviewer')
+
+
+class ArchivedConversationAdmin(admin.ModelAdmin):
+    list_display = ('paper', 'reviewer', 'messages_count', 'archived_at')
+    list_select_related = ('paper', 'reviewer')
+    exclude = ('data',)
+    readonly_fields = ('paper', 'reviewer', 'first_message_id', 'last_message_id', 'messages_count', 'archived_at')
+
+
 class MassEmailModel(models.Model):
     class Meta:
         verbose_name_plural = 'Mass email'
@@ -31,56 +47,63 @@ class MassEmailForm(forms.Form):
     recipients = forms.ChoiceField(label='Adresaci', choices=RECIPIENT_CHOICES)
     content = SummernoteTextFormField(label='Treść')
 
+    @staticmethod
+    def recipient_emails(choice):
+        """
+        Returns distinct email addresses of the recipients group with a single query
+        :param choice: string (key of RECIPIENT_CHOICES)
+        :return: queryset of strings
+        """
+        users = User.objects.exclude(email='')
+        # HAS PAPER WITH FLAG APPROVED
+        if choice == '2':
+            users = users.filter(paper__approved=True)
+        # HAS PAPER WITH REVIEW THAT HAS FINAL GRADE == APPROVE
+        elif choice == '3':
+            users = users.filter(paper__review_summary__best_final_grade=1)
+        return users.order_by('email').values_list('email', flat=True).distinct()
+
+
+def chunks(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
 
 class MassEmailView(FormView):
+    """
+    Sends email to a group of users, number of recipients is shown for confirmation before anything is queued,
+    recipients are split between many messages, so SMTP server's limit of recipients per message is not exceeded
+    """
     template_name = 'papers/mass_email.html'
     form_class = MassEmailForm
     success_url = '/admin'
 
     def form_valid(self, form):
-        if form.is_valid():
-            recipients_choice = form.cleaned_data['recipients']
-
-            recipients = []
-            users = User.objects.all()
-            # ALL USERS
-            if recipients_choice == '1':
-                recipients = users
-            # HAS PAPER WITH FLAG APPROVED
-            elif recipients_choice == '2':
-                for user in users:
-                    for paper in user.paper_set.all():
-                        if paper.approved:
-                            recipients.append(user)
-                            break
-            # HAS PAPER WITH REVIEW THAT HAS FINAL GRADE == APPROVE
-            elif recipients_choice == '3':
-                for user in users:
-                    has_email_to_sent = False
-                    for paper in user.paper_set.all():
-                        for review in paper.review_set.all():
-                            if int(review.final_grade.value) == 1:
-                                recipients.append(user)
-                                has_email_to_sent = True
-                                break
-                        if has_email_to_sent == True:
-                            break
-            emails = list()
-            for recipient in recipients:
-                emails.append(recipient.email)
-            #make all emails unique in list
-            emails = list(dict.fromkeys(emails))
-            # Send message
-            try:
-                CC = list()
-                CC.append(SITE_ADMIN_MAIL)
-                msg = EmailMultiAlternatives(form.cleaned_data['subject'], form.cleaned_data['content'],
-                                             SITE_ADMIN_MAIL,CC, bcc=emails, headers={'Reply-To': SITE_ADMIN_MAIL})
-                msg.attach_alternative(form.cleaned_data['content'], "text/html")
-                msg.send()
-                messages.add_message(self.request, messages.SUCCESS, f'Message sent to {len(emails)} users')
-            except BadHeaderError:
-                messages.add_message(self.request, messages.WARNING, 'Unable to send mail')
+        emails = list(form.recipient_emails(form.cleaned_data['recipients']))
+        parts = chunks(emails, MAILING_BCC_CHUNK_SIZE)
+        if 'confirm' not in self.request.POST:
+            return self.render_to_response(self.get_context_data(form=form, preview={
+                'recipients': len(emails),
+                'messages': len(parts),
+            }))
+
+        try:
+            queued = enqueue([
+                # site admin gets only one copy of the message
+                EmailMultiAlternatives(form.cleaned_data['subject'], form.cleaned_data['content'], SITE_ADMIN_MAIL,
+                                       [SITE_ADMIN_MAIL] if number == 0 else [], bcc=part,
+                                       headers={'Reply-To': SITE_ADMIN_MAIL},
+                                       alternatives=[(form.cleaned_data['content'], 'text/html')])
+                for number, part in enumerate(parts)
+            ])
+        except BadHeaderError:
+            messages.add_message(self.request, messages.WARNING, 'Nie można wysłać wiadomości')
+            return super().form_valid(form)
+
+        outbox_url = f'{reverse("admin:mailing_outgoingemail_changelist")}?{urlencode({"q": form.cleaned_data["subject"]})}'
+        messages.add_message(self.request, messages.SUCCESS, format_html(
+            'Wiadomość do {} adresatów dodano do kolejki jako {} emaili, '
+            '<a href="{}">postęp wysyłki można śledzić w skrzynce nadawczej</a>',
+            len(emails), len(queued), outbox_url))
         return super().form_valid(form)
 
 
@@ -99,10 +122,13 @@ admin.site.register(StudentClub)
 admin.site.register(Grade)
 admin.site.register(Paper)
 admin.site.register(CoAuthor)
+admin.site.register(Keyword)
 admin.site.register(UploadedFile)
 admin.site.register(Review)
+admin.site.register(PaperReviewSummary)
 admin.site.register(Message)
-admin.site.register(MessageSeen)
+admin.site.register(MessageReadCursor, MessageReadCursorAdmin)
+admin.site.register(ArchivedConversation, ArchivedConversationAdmin)
 admin.site.register(NotificationPeriod)
 admin.site.register(MassEmailModel, MassEmailModelAdmin)
 admin.site.register(Announcement, AnnouncementAdmin)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PapersConfig(AppConfig):
     name = 'papers'
+
+    def ready(self):
+        import papers.signals
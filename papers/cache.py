@@ -0,0 +1,143 @@
+import hashlib
+import re
+import uuid
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from StronaProjektyKol.settings import PAPERS_FILTER_CACHE_TIMEOUT, CARDS_CACHE_TIMEOUT
+from users.roles import is_reviewer
+
+DATA_VERSION_KEY = 'papers:data_version'
+FILTER_RESULT_KEY = 'papers:filter:{token}'
+FACETS_KEY = 'papers:facets:{token}'
+CARD_VERSION_KEY = 'cards:version:{kind}:{pk}'
+CARD_KEY = 'cards:parts:{kind}:{pk}:{version}:{variant}'
+IGNORED_FILTER_PARAMS = ('page', 'csrfmiddlewaretoken', 'id', 't')
+
+
+def get_data_version():
+    """
+    Returns current version of papers data, every change of papers or related objects changes it.
+    Version is random, so when its key is evicted no filter results of an older version become valid again.
+    :return: string
+    """
+    return cache.get_or_set(DATA_VERSION_KEY, lambda: uuid.uuid4().hex[:12], None)
+
+
+def bump_data_version():
+    """
+    Invalidates every cached entry that depends on papers data
+    :return:
+    """
+    cache.set(DATA_VERSION_KEY, uuid.uuid4().hex[:12], None)
+
+
+def get_user_role(user):
+    """
+    Returns string identifying set of papers visible for the given user
+    :param user: User object
+    :return: string
+    """
+    if user.is_staff:
+        return 'staff'
+    if is_reviewer(user):
+        return f'reviewer:{user.pk}'
+    return f'user:{user.pk}'
+
+
+def normalize_params(params):
+    """
+    Builds canonical representation of filter parameters, so that the same filter gives the same token
+    :param params: QueryDict (request.GET)
+    :return: string
+    """
+    normalized = []
+    for key in sorted(params.keys()):
+        if key in IGNORED_FILTER_PARAMS:
+            continue
+        values = sorted(value.strip() for value in params.getlist(key) if value.strip())
+        if values:
+            normalized.append(f'{key}={",".join(values)}')
+    return '&'.join(normalized)
+
+
+def get_filter_token(params, user):
+    """
+    Returns short token identifying filter result for the given parameters, user role and data version
+    :param params: QueryDict (request.GET)
+    :param user: User object
+    :return: string
+    """
+    key = f'{normalize_params(params)}|{get_user_role(user)}|{get_data_version()}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def get_filter_result(token):
+    """
+    Returns ordered list of papers' pks stored under the given token
+    :param token: string
+    :return: list of integers or None if the entry has expired
+    """
+    if not token:
+        return None
+    return cache.get(FILTER_RESULT_KEY.format(token=token))
+
+
+def set_filter_result(token, pks):
+    cache.set(FILTER_RESULT_KEY.format(token=token), list(pks), PAPERS_FILTER_CACHE_TIMEOUT)
+
+
+def get_facets(token, compute):
+    """
+    Returns facet counts of the filter result stored under the given token, computed when missing
+    :param token: string (filter token, it already contains data version)
+    :param compute: function computing facet counts
+    :return: dict
+    """
+    return cache.get_or_set(FACETS_KEY.format(token=token), compute, PAPERS_FILTER_CACHE_TIMEOUT)
+
+
+def get_card_version(kind, pk):
+    """
+    Returns version of the object's card, it changes every time the object or its related objects change
+    :param kind: string ('paper' or 'document')
+    :param pk: integer (id of the object)
+    :return: string
+    """
+    return cache.get_or_set(CARD_VERSION_KEY.format(kind=kind, pk=pk), lambda: uuid.uuid4().hex[:12], None)
+
+
+def bump_card_versions(kind, pks):
+    """
+    Invalidates cached cards of the given objects
+    :param kind: string ('paper' or 'document')
+    :param pks: iterable of integers
+    :return:
+    """
+    cache.set_many({CARD_VERSION_KEY.format(kind=kind, pk=pk): uuid.uuid4().hex[:12] for pk in pks}, None)
+
+
+def get_card(kind, pk, variant, template_name, context, values):
+    """
+    Returns HTML of the object's card, card is cached with placeholders of the values that differ between requests.
+    Placeholders contain random marker, so content of the card (e.g. description) can't be mistaken for them.
+    :param kind: string ('paper' or 'document')
+    :param pk: integer (id of the object)
+    :param variant: string (viewer dependent part of the key)
+    :param template_name: string
+    :param context: dict (context of the template)
+    :param values: dict (names of context variables and values inserted into the cached card)
+    :return: string
+    """
+    key = CARD_KEY.format(kind=kind, pk=pk, version=get_card_version(kind, pk), variant=variant)
+    parts = cache.get(key)
+    if parts is None:
+        marker = uuid.uuid4().hex
+        html = render_to_string(template_name, context={**context, **{name: f'{marker}{name}{marker}'
+                                                                      for name in values}})
+        # odd items are names of the values, even items are fixed parts of the card
+        parts = re.split(f'{marker}(\\w+){marker}', html)
+        cache.set(key, parts, CARDS_CACHE_TIMEOUT)
+    return ''.join(part if index % 2 == 0 else escape(values[part]) for index, part in enumerate(parts))
@@ -0,0 +1,175 @@
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from .models import Paper, Grade
+
+EXPORT_HEADER = ('Tytuł', 'Autor', 'Email autora', 'Współautorzy', 'Koło naukowe', 'Status', 'Recenzenci',
+                 'Przydzielonych recenzentów', 'Wystawionych recenzji', 'Oceny końcowe',
+                 'Średnia - zgodność z tematyką', 'Średnia - oryginalność', 'Średnia - poprawność merytoryczna',
+                 'Średnia - jakość prezentacji', 'Średnia - ocena końcowa', 'Data dodania', 'Data modyfikacji')
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields rows describing papers, papers are loaded in chunks, so memory usage
+    doesn't depend on number of exported papers
+    :param queryset: ordered Paper queryset
+    :param chunk_size: integer (number of papers loaded at once)
+    :return: generator of tuples
+    """
+    final_grades = {str(value): name for value, name in
+                    Grade.objects.filter(tag='final_grade').values_list('value', 'name')}
+
+    chunk = []
+    for pk in queryset.values_list('pk', flat=True).iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) == chunk_size:
+            yield from _chunk_rows(chunk, final_grades)
+            chunk = []
+    if chunk:
+        yield from _chunk_rows(chunk, final_grades)
+
+
+def _chunk_rows(pks, final_grades):
+    papers = Paper.objects.with_list_data().select_related('review_summary').in_bulk(pks)
+    for pk in pks:
+        paper = papers.get(pk)
+        if paper is None:
+            continue
+        summary = getattr(paper, 'review_summary', None)
+        grades = [final_grades.get(value, value) for value in (summary.final_grades if summary else '').split(',')
+                  if value]
+        yield (
+            paper.title,
+            f'{paper.author.first_name} {paper.author.last_name}',
+            paper.author.email,
+            ', '.join(f'{coauthor.name} {coauthor.surname}' for coauthor in paper.coauthor_set.all()),
+            paper.club.name if paper.club else '',
+            'Gotowy' if paper.approved else 'W przygotowaniu',
+            ', '.join(f'{reviewer.first_name} {reviewer.last_name}' for reviewer in paper.reviewers.all()),
+            summary.reviewers_count if summary else 0,
+            summary.reviews_count if summary else 0,
+            ', '.join(grades),
+            *[_format_average(getattr(summary, f'{field}_avg', None)) for field in
+              ('correspondence', 'originality', 'merits', 'presentation', 'final_grade')],
+            paper.created_at.strftime('%Y-%m-%d %H:%M'),
+            paper.updated_at.strftime('%Y-%m-%d %H:%M'),
+        )
+
+
+def _format_average(value):
+    return '' if value is None else round(value, 2)
+
+
+class _Echo:
+    """
+    File-like object that returns written value instead of storing it
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """
+    Yields CSV lines, header is sent before any query is made
+    :param rows: iterable of tuples
+    :return: generator of strings
+    """
+    writer = csv.writer(_Echo())
+    yield '\ufeff' + writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _StreamBuffer:
+    """
+    Non-seekable file-like object collecting data written by zipfile until it is sent to the client
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_STATIC_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="xl/workbook.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Artykuły" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+     '</Relationships>'),
+)
+
+XML_ILLEGAL_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_row(row):
+    cells = []
+    for value in row:
+        if isinstance(value, (int, float)):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = escape(XML_ILLEGAL_CHARS_RE.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'.encode('utf-8')
+
+
+def stream_xlsx(rows, flush_every=100):
+    """
+    Yields parts of XLSX file, the sheet is compressed and sent while rows are being generated
+    :param rows: iterable of tuples
+    :param flush_every: integer (number of rows after which collected data is sent)
+    :return: generator of bytes
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_STATIC_PARTS:
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row(EXPORT_HEADER))
+            yield buffer.pop()
+            for number, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row))
+                if number % flush_every == 0:
+                    yield buffer.pop()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.pop()
@@ -7,30 +7,33 @@ from django_filters import CharFilter, ModelChoiceFilter, ChoiceFilter
 from django_filters.constants import EMPTY_VALUES
 from django_filters.widgets import CSVWidget
 
-from .models import Paper, StudentClub, Review, Grade
+from . import search
+from .models import Paper, StudentClub, Grade, Keyword, PaperKeyword, fold_name
 
 
-class MultiValueCharFilter(django_filters.BaseCSVFilter, django_filters.CharFilter):
+def prefix_range(field, prefix):
     """
-    Custom filter to accept multiple CharFilter strings provided using CSVWidget
+    Builds condition matching values starting with the prefix, it is expressed as a range and not as LIKE
+    (used by __startswith), so index of the field can be used
+    :param field: string (lookup path of the field)
+    :param prefix: string
+    :return: Q object
+    """
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': f'{prefix}\uffff'})
+
+
+class MultiValueKeywordFilter(django_filters.BaseCSVFilter, django_filters.CharFilter):
+    """
+    Custom filter to accept multiple keywords provided using CSVWidget,
+    papers having any keyword starting with one of the given values are returned
     """
 
     def filter(self, qs, value):
-        values = value or []
-        queryset = None
-        for value in values:
-            if value in EMPTY_VALUES:
-                return qs
-            if self.distinct:
-                qs = qs.distinct()
-            lookup = '%s__%s' % (self.field_name, self.lookup_expr)
-            if not queryset:
-                queryset = self.get_method(qs)(**{lookup: value})
-            else:
-                queryset = queryset | self.get_method(qs)(**{lookup: value})
-        if not queryset and len(values) == 0:
-            queryset = qs.all()
-        return queryset
+        values = [fold_name(value) for value in value or [] if value not in EMPTY_VALUES]
+        if not values:
+            return qs
+        keywords = Keyword.objects.filter(reduce(or_, [prefix_range('folded', value) for value in values]))
+        return qs.filter(pk__in=PaperKeyword.objects.filter(keyword__in=keywords).values('paper'))
 
 
 class MultiValueUserFilter(django_filters.BaseCSVFilter, django_filters.CharFilter):
@@ -65,22 +68,10 @@ class MultiValueUserFilter(django_filters.BaseCSVFilter, django_filters.CharFilt
         return queryset
 
     def name_filter(self, qs, name):
-        found_ids = []
-        for paper in qs:
-            if paper.coauthor_set.all().filter(name__icontains=name).exists():
-                found_ids.append(paper.id)
-        queryset = qs.filter(pk__in=found_ids)
-        queryset = queryset | qs.filter(author__first_name__icontains=name)
-        return queryset.distinct()
+        return qs.filter(prefix_range('author_index__first_name', fold_name(name))).distinct()
 
     def surname_filter(self, qs, surname):
-        found_ids = []
-        for paper in qs:
-            if paper.coauthor_set.all().filter(surname__icontains=surname).exists():
-                found_ids.append(paper.id)
-        queryset = qs.filter(pk__in=found_ids)
-        queryset = queryset | qs.filter(author__last_name__icontains=surname)
-        return queryset.distinct()
+        return qs.filter(prefix_range('author_index__last_name', fold_name(surname))).distinct()
 
 
 class PaperFilter(django_filters.FilterSet):
@@ -105,8 +96,11 @@ class PaperFilter(django_filters.FilterSet):
 
     title = CharFilter(field_name='title', lookup_expr='icontains', label='Tytuł', help_text='Tytuł artykułu')
 
-    keywords = MultiValueCharFilter(field_name='keywords', label='Słowa kluczowe',
-                                    lookup_expr='icontains', widget=CSVWidget, help_text='Słowa oddzielone przecinkiem')
+    search = CharFilter(label='Wyszukaj', method='search_func',
+                        help_text='Tytuł, słowa kluczowe lub treść streszczenia')
+
+    keywords = MultiValueKeywordFilter(field_name='keywords', label='Słowa kluczowe', widget=CSVWidget,
+                                       help_text='Słowa oddzielone przecinkiem')
 
     author_surname = MultiValueUserFilter(ref_field='last_name', label='Nazwiska autorów', widget=CSVWidget,
                                           help_text='Oddzielone przecinkiem')
@@ -129,34 +123,74 @@ class PaperFilter(django_filters.FilterSet):
     final_grade = ChoiceFilter(choices=FINAL_GRADE_CHOICE, field_name='final_grade', label='Ocena końcowa',
                                method='final_grade_func')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # ids of papers ordered by relevance, set when full text search is used
+        self.search_ranking = None
+
+    def search_func(self, queryset, val1, query):
+        self.search_ranking = search.ranked_ids(query)
+        return search.filter_papers(queryset, query)
+
     def is_approved(self, queryset, val1, val2):
         return queryset.filter(approved=val2).distinct()
 
     def reviewers_check(self, queryset, val1, val2):
-        return queryset.annotate(reviewers_num=Count('reviewers')).filter(reviewers_num=val2).distinct()
+        return queryset.filter(review_summary__reviewers_count=int(val2))
 
     def final_grade_func(self, queryset, val1, val2):
-        return queryset.filter(Q(id__in=Review.objects.filter(final_grade__value=val2))).distinct()
+        return queryset.filter(review_summary__final_grades__contains=f',{val2},')
 
     def reviewers_lastname(self, queryset, val1, val2):
         return queryset.filter(reduce(or_, [Q(reviewers__last_name__icontains=c) for c in val2])).distinct()
 
     def reviews_count_func(self, queryset, val1, reviews_count):
-        to_exclude = []
-        reviews_count = int(reviews_count)
-        for paper in queryset.all():
-            ids = []
-            reviews = Review.objects.filter(paper__id=paper.id).all()
-
-            for review in reviews:
-                if review.author in paper.reviewers.all():
-                    ids.append(review.pk)
-
-            reviews = reviews.filter(Q(id__in=[obj for obj in ids]))
-            if not reviews.count() == reviews_count:
-                to_exclude.append(paper)
-
-        return queryset.filter(~Q(id__in=[obj.id for obj in to_exclude]))
+        return queryset.filter(review_summary__reviews_count=int(reviews_count))
+
+    def get_facet_counts(self):
+        """
+        Counts papers of the current result for every choice of the filter's choice fields,
+        all counts are computed by two grouped queries
+        :return: dict {field name: {choice value: count}}
+        """
+        queryset = self.qs
+        final_grades = [str(value) for value in
+                        Grade.objects.filter(tag='final_grade').values_list('value', flat=True).distinct()]
+
+        aggregates = {
+            'approved:True': Count('pk', filter=Q(approved=True)),
+            'approved:False': Count('pk', filter=Q(approved=False)),
+        }
+        for value in ('0', '1', '2'):
+            aggregates[f'reviewers_field:{value}'] = Count('pk', filter=Q(review_summary__reviewers_count=value))
+            aggregates[f'reviews_count:{value}'] = Count('pk', filter=Q(review_summary__reviews_count=value))
+        for value in final_grades:
+            aggregates[f'final_grade:{value}'] = Count('pk', filter=Q(review_summary__final_grades__contains=f',{value},'))
+
+        facets = {'club': {}, 'approved': {}, 'reviewers_field': {}, 'reviews_count': {}, 'final_grade': {}}
+        for key, count in queryset.aggregate(**aggregates).items():
+            name, value = key.split(':')
+            facets[name][value] = count
+        for row in queryset.order_by().values('club').annotate(count=Count('pk', distinct=True)):
+            facets['club'][str(row['club'])] = row['count']
+        return facets
+
+    @staticmethod
+    def apply_facet_counts(form, facets):
+        """
+        Appends papers counts to labels of the form's choices, e.g. "Koło X (34)"
+        :param form: form of the PaperFilter
+        :param facets: dict returned by get_facet_counts
+        :return:
+        """
+        for name, counts in facets.items():
+            field = form.fields[name]
+            if name == 'club':
+                field.label_from_instance = lambda obj, counts=counts: f'{obj} ({counts.get(str(obj.pk), 0)})'
+                continue
+            # empty choice is left out, the field adds its empty label to assigned choices again
+            field.choices = [(value, f'{label} ({counts.get(str(value), 0)})')
+                             for value, label in field.choices if value != '']
 
     class Meta:
         model = Paper
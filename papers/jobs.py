@@ -0,0 +1,11 @@
+from datetime import timedelta
+
+from scheduler.schedule import register
+from .models import Paper, PaperReviewSummary
+
+
+@register('rebuild_review_summaries', timedelta(days=1))
+def rebuild_review_summaries():
+    # summaries are updated on every change, daily rebuild only repairs those changed outside of the site
+    for paper_id in Paper.objects.values_list('pk', flat=True).iterator():
+        PaperReviewSummary.update_for_paper(paper_id)
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from StronaProjektyKol.settings import MESSAGING_ARCHIVE_AFTER_DAYS
+from messaging import archive
+from papers.models import Paper
+
+
+class Command(BaseCommand):
+    help = 'Moves messages of inactive conversations to the archive, archived messages stay readable on the site'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=MESSAGING_ARCHIVE_AFTER_DAYS,
+                            help='Archive conversations without any message for this many days')
+        parser.add_argument('--before', help='Archive conversations without any message since this date (YYYY-MM-DD)')
+        parser.add_argument('--paper', type=int, action='append', default=[],
+                            help='Archive conversations of this paper only, e.g. of a finished edition '
+                                 '(can be given many times)')
+        parser.add_argument('--dry-run', action='store_true', help='Only list conversations, nothing is changed')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = timezone.make_aware(datetime.strptime(options['before'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('Date should be given as YYYY-MM-DD')
+        else:
+            before = timezone.now() - timedelta(days=options['days'])
+
+        papers = Paper.objects.all()
+        if options['paper']:
+            papers = papers.filter(pk__in=options['paper'])
+
+        conversations = messages_count = 0
+        for conversation in archive.conversations_to_archive(papers, before).iterator():
+            if options['dry_run']:
+                self.stdout.write(f'Paper {conversation["paper"]}, reviewer {conversation["reviewer"]}')
+                count = 1
+            else:
+                count = archive.archive_conversation(conversation['paper'], conversation['reviewer'])
+            if count:
+                conversations += 1
+                messages_count += count
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{conversations} conversations would be archived'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Archived {messages_count} messages of {conversations} conversations'))
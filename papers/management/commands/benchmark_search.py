@@ -0,0 +1,54 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from papers import search
+from papers.models import Paper
+
+WORDS = ('analiza', 'sieci', 'neuronowe', 'robot', 'mobilny', 'sterowanie', 'energia', 'słoneczna', 'materiały',
+         'kompozytowe', 'uczenie', 'maszynowe', 'łożysko', 'wytrzymałość', 'żuraw', 'symulacja', 'pomiar',
+         'czujnik', 'obraz', 'przetwarzanie', 'dron', 'napęd', 'elektryczny', 'optymalizacja', 'algorytm')
+
+
+class Command(BaseCommand):
+    help = 'Measures full text search latency on generated papers, all generated data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--papers', type=int, default=10000, help='Number of generated papers')
+        parser.add_argument('--queries', type=int, default=200, help='Number of measured queries')
+
+    def handle(self, *args, **options):
+        if search.get_backend() is None:
+            self.stdout.write(self.style.WARNING('Full text search is not supported by the database'))
+            return
+
+        randomizer = random.Random(0)
+        with transaction.atomic():
+            author = User.objects.create(username=f'benchmark-{time.time()}')
+            Paper.objects.bulk_create([
+                Paper(title=' '.join(randomizer.sample(WORDS, 5)), author=author,
+                      keywords=', '.join(randomizer.sample(WORDS, 3)),
+                      description='<p>' + ' '.join(randomizer.choices(WORDS, k=120)) + '</p>')
+                for _ in range(options['papers'])
+            ], batch_size=500)
+
+            start = time.perf_counter()
+            count = search.rebuild_index(Paper.objects.all())
+            self.stdout.write(f'Indexed {count} papers in {time.perf_counter() - start:.2f} s')
+
+            timings = []
+            for _ in range(options['queries']):
+                query = ' '.join(randomizer.sample(WORDS, randomizer.randint(1, 2)))
+                start = time.perf_counter()
+                search.ranked_ids(query)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            timings.sort()
+            self.stdout.write(f'Queries: {len(timings)}, mean: {statistics.mean(timings):.2f} ms, '
+                              f'median: {statistics.median(timings):.2f} ms, '
+                              f'p95: {timings[int(len(timings) * 0.95) - 1]:.2f} ms')
+            transaction.set_rollback(True)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from papers.models import Paper, PaperReviewSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds review summaries of papers or verifies them against reviews and reviewers tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only compare stored summaries with computed ones, nothing is changed')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+            return
+
+        count = 0
+        for paper_id in Paper.objects.values_list('pk', flat=True).iterator():
+            PaperReviewSummary.update_for_paper(paper_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} review summaries'))
+
+    def verify(self):
+        stored = {summary.paper_id: summary for summary in PaperReviewSummary.objects.all()}
+        mismatches = 0
+        for paper_id in Paper.objects.values_list('pk', flat=True).iterator():
+            summary = stored.get(paper_id)
+            if summary is None:
+                mismatches += 1
+                self.stdout.write(self.style.WARNING(f'Paper {paper_id}: summary is missing'))
+                continue
+            for field, value in PaperReviewSummary.compute(paper_id).items():
+                if getattr(summary, field) != value:
+                    mismatches += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'Paper {paper_id}: {field} is {getattr(summary, field)!r}, should be {value!r}'))
+
+        if mismatches:
+            raise CommandError(f'Found {mismatches} mismatches, run the command without --verify to fix them')
+        self.stdout.write(self.style.SUCCESS(f'All {len(stored)} review summaries are correct'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from messaging import search as messages_search
+from papers import search
+from papers.models import Paper, Message
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds full text search indexes of papers and messages'
+
+    def handle(self, *args, **options):
+        if search.get_backend() is None:
+            self.stdout.write(self.style.WARNING('Full text search is not supported by the database'))
+            return
+        with transaction.atomic():
+            count = search.rebuild_index(Paper.objects.all())
+            messages_count = messages_search.rebuild_index(Message.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} papers and {messages_count} messages'))
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import papers.models
+
+
+def build_author_search_index(apps, schema_editor):
+    Paper = apps.get_model('papers', 'Paper')
+    CoAuthor = apps.get_model('papers', 'CoAuthor')
+    AuthorSearchIndex = apps.get_model('papers', 'AuthorSearchIndex')
+    fold_name = papers.models.fold_name
+
+    entries = []
+    for paper in Paper.objects.select_related('author').iterator():
+        entries.append(AuthorSearchIndex(paper_id=paper.pk, first_name=fold_name(paper.author.first_name),
+                                         last_name=fold_name(paper.author.last_name)))
+    for coauthor in CoAuthor.objects.iterator():
+        entries.append(AuthorSearchIndex(paper_id=coauthor.paper_id, coauthor_id=coauthor.pk,
+                                         first_name=fold_name(coauthor.name), last_name=fold_name(coauthor.surname)))
+    AuthorSearchIndex.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorSearchIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(db_index=True, max_length=150)),
+                ('last_name', models.CharField(db_index=True, max_length=150)),
+                ('coauthor', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='papers.coauthor')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_index', to='papers.paper')),
+            ],
+        ),
+        migrations.RunPython(build_author_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+from papers import search
+
+
+def create_search_index(apps, schema_editor):
+    backend = search.get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    Paper = apps.get_model('papers', 'Paper')
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+        for pk, title, keywords, description in Paper.objects.values_list('pk', 'title', 'keywords',
+                                                                          'description').iterator():
+            backend.update(cursor, pk, title, keywords, description)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = search.get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0002_author_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import papers.models
+
+
+def parse_papers_keywords(apps, schema_editor):
+    Paper = apps.get_model('papers', 'Paper')
+    Keyword = apps.get_model('papers', 'Keyword')
+    PaperKeyword = apps.get_model('papers', 'PaperKeyword')
+
+    papers_keywords = {pk: papers.models.parse_keywords(keywords)
+                       for pk, keywords in Paper.objects.values_list('pk', 'keywords').iterator()}
+    names = {name for keywords in papers_keywords.values() for name in keywords}
+    Keyword.objects.bulk_create([Keyword(name=name, folded=papers.models.fold_name(name)) for name in names],
+                                batch_size=500)
+    keyword_ids = dict(Keyword.objects.values_list('name', 'pk'))
+    PaperKeyword.objects.bulk_create([PaperKeyword(paper_id=pk, keyword_id=keyword_ids[name])
+                                      for pk, keywords in papers_keywords.items() for name in keywords],
+                                     batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0003_paper_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Keyword',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True)),
+                ('folded', models.CharField(db_index=True, max_length=128)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaperKeyword',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='papers.keyword')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='papers.paper')),
+            ],
+            options={
+                'unique_together': {('paper', 'keyword')},
+            },
+        ),
+        migrations.AddField(
+            model_name='keyword',
+            name='papers',
+            field=models.ManyToManyField(related_name='keyword_set', through='papers.PaperKeyword', to='papers.Paper'),
+        ),
+        migrations.RunPython(parse_papers_keywords, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+GRADED_FIELDS = ('correspondence', 'originality', 'merits', 'presentation', 'final_grade')
+
+
+def create_review_summaries(apps, schema_editor):
+    Paper = apps.get_model('papers', 'Paper')
+    Review = apps.get_model('papers', 'Review')
+    PaperReviewSummary = apps.get_model('papers', 'PaperReviewSummary')
+
+    summaries = []
+    for paper in Paper.objects.prefetch_related('reviewers').iterator():
+        reviewers = list(paper.reviewers.all())
+        values = {field: [] for field in GRADED_FIELDS}
+        reviews = Review.objects.filter(paper=paper, author__in=reviewers).select_related(*GRADED_FIELDS)
+        reviews_count = 0
+        for review in reviews:
+            reviews_count += 1
+            for field in GRADED_FIELDS:
+                grade = getattr(review, field)
+                if grade is not None and str(grade.value).strip().isdigit():
+                    values[field].append(int(grade.value))
+        final_grades = sorted(values['final_grade'])
+        summary = PaperReviewSummary(
+            paper=paper,
+            reviewers_count=len(reviewers),
+            reviews_count=reviews_count,
+            final_grades=f',{",".join(str(value) for value in final_grades)},' if final_grades else '',
+            best_final_grade=final_grades[0] if final_grades else None,
+        )
+        for field in GRADED_FIELDS:
+            setattr(summary, f'{field}_avg', sum(values[field]) / len(values[field]) if values[field] else None)
+        summaries.append(summary)
+    PaperReviewSummary.objects.bulk_create(summaries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0004_keywords'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaperReviewSummary',
+            fields=[
+                ('paper', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_summary', serialize=False, to='papers.paper')),
+                ('reviewers_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('reviews_count', models.PositiveIntegerField(db_index=True, default=0)),
+                ('final_grades', models.CharField(blank=True, default='', max_length=64)),
+                ('best_final_grade', models.PositiveSmallIntegerField(blank=True, db_index=True, null=True)),
+                ('correspondence_avg', models.FloatField(blank=True, null=True)),
+                ('originality_avg', models.FloatField(blank=True, null=True)),
+                ('merits_avg', models.FloatField(blank=True, null=True)),
+                ('presentation_avg', models.FloatField(blank=True, null=True)),
+                ('final_grade_avg', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_review_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db.models import Max
+
+
+def create_read_cursors(apps, schema_editor):
+    MessageSeen = apps.get_model('papers', 'MessageSeen')
+    MessageReadCursor = apps.get_model('papers', 'MessageReadCursor')
+
+    # newest seen message of every conversation becomes reader's cursor
+    rows = MessageSeen.objects.order_by().values('reader', 'message__paper', 'message__reviewer') \
+        .annotate(last_read=Max('message'))
+    MessageReadCursor.objects.bulk_create([
+        MessageReadCursor(reader_id=row['reader'], paper_id=row['message__paper'],
+                          reviewer_id=row['message__reviewer'], last_read_message_id=row['last_read'])
+        for row in rows.iterator()
+    ], batch_size=500)
+
+
+def create_seen_records(apps, schema_editor):
+    Message = apps.get_model('papers', 'Message')
+    MessageSeen = apps.get_model('papers', 'MessageSeen')
+    MessageReadCursor = apps.get_model('papers', 'MessageReadCursor')
+
+    for cursor in MessageReadCursor.objects.iterator():
+        messages = Message.objects.filter(paper=cursor.paper_id, reviewer=cursor.reviewer_id,
+                                          pk__lte=cursor.last_read_message_id).exclude(author=cursor.reader_id)
+        MessageSeen.objects.bulk_create([MessageSeen(message_id=pk, reader_id=cursor.reader_id)
+                                         for pk in messages.values_list('pk', flat=True)], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('papers', '0005_paper_review_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageReadCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='papers.paper')),
+                ('reader', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_read_cursors', to=settings.AUTH_USER_MODEL)),
+                ('reviewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('reader', 'paper', 'reviewer')},
+            },
+        ),
+        migrations.RunPython(create_read_cursors, create_seen_records),
+        migrations.DeleteModel(
+            name='MessageSeen',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0006_message_read_cursor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['paper', 'reviewer', 'id'], name='papers_message_conversation'),
+        ),
+    ]
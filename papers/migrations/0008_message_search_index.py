@@ -0,0 +1,33 @@
+from django.db import migrations
+
+from messaging import search
+
+
+def create_search_index(apps, schema_editor):
+    backend = search.get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    Message = apps.get_model('papers', 'Message')
+    with schema_editor.connection.cursor() as cursor:
+        backend.create(cursor)
+        for pk, text in Message.objects.values_list('pk', 'text').iterator():
+            backend.update(cursor, pk, text)
+
+
+def drop_search_index(apps, schema_editor):
+    backend = search.get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        backend.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('papers', '0007_message_conversation_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.18 on 2026-10-18 12:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('papers', '0008_message_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedConversation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_message_id', models.PositiveIntegerField()),
+                ('last_message_id', models.PositiveIntegerField()),
+                ('messages_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_conversations', to='papers.paper')),
+                ('reviewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedconversation',
+            index=models.Index(fields=['paper', 'reviewer', 'last_message_id'], name='papers_archive_conversation'),
+        ),
+    ]
@@ -1,9 +1,15 @@
+import json
 import os
 import re
 import textwrap
+import unicodedata
+import zlib
+from datetime import datetime
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.db.models.signals import pre_delete
 from django.utils import timezone
 import textwrap
@@ -29,6 +35,17 @@ class StudentClub(models.Model):
         return club.pk
 
 
+class PaperQuerySet(models.QuerySet):
+    def with_list_data(self):
+        """
+        Loads everything that is displayed on paper's card in the papers list,
+        so rendering a page takes fixed number of queries
+        :return: Paper queryset
+        """
+        return self.select_related('author', 'club').prefetch_related('coauthor_set', 'reviewers',
+                                                                      'uploadedfile_set')
+
+
 class Paper(models.Model):
     title = models.CharField(max_length=128)
     club = models.ForeignKey(StudentClub, default=StudentClub.get_default_pk, on_delete=models.SET_DEFAULT)
@@ -41,6 +58,8 @@ class Paper(models.Model):
     updated_at = models.DateTimeField(default=timezone.now)
     statement = models.PositiveIntegerField(default=0)
 
+    objects = PaperQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.title[0:40]}'
 
@@ -48,14 +67,27 @@ class Paper(models.Model):
         if user not in self.reviewers.all() and user != self.author:
             return []
 
-        messages = []
-        for message in Message.objects.filter(paper=self):
-            if message.author == user:
-                continue
-            if not message.is_seen(user):
-                messages.append(message)
+        return list(Message.objects.filter(paper=self).of_participant(user).unread_by(user).order_by('pk'))
 
-        return messages
+    @classmethod
+    def get_unread_messages_counts(cls, papers, user):
+        """
+        Counts unread messages of the given user for many papers at once
+        :param papers: iterable of Paper objects or their ids
+        :param user: User object
+        :return: dict {paper_pk: unread_count} (papers without unread messages are omitted)
+        """
+        paper_ids = [getattr(paper, 'pk', paper) for paper in papers]
+        if not paper_ids or not user.is_authenticated:
+            return {}
+
+        counts = Message.objects.filter(paper__in=paper_ids) \
+            .of_participant(user) \
+            .unread_by(user) \
+            .order_by() \
+            .values('paper') \
+            .annotate(unread=Count('pk'))
+        return {row['paper']: row['unread'] for row in counts}
 
 
 class CoAuthor(models.Model):
@@ -65,6 +97,115 @@ class CoAuthor(models.Model):
     paper = models.ForeignKey(Paper, on_delete=models.CASCADE)
 
 
+NAME_FOLD_TRANSLATION = str.maketrans({'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D', 'ø': 'o', 'Ø': 'O', 'ß': 'ss'})
+
+
+def fold_name(value):
+    """
+    Normalizes name for searching: removes diacritics and changes letters to lowercase
+    (e.g. 'Żółkiewski' -> 'zolkiewski', 'Łukasz' -> 'lukasz')
+    :param value: string
+    :return: string
+    """
+    value = unicodedata.normalize('NFKD', (value or '').translate(NAME_FOLD_TRANSLATION))
+    return ''.join(char for char in value if not unicodedata.combining(char)).lower().strip()
+
+
+def parse_keywords(keywords):
+    """
+    Splits keywords given by the user into list of unique, normalized keywords
+    :param keywords: string (keywords separated by comma or semicolon)
+    :return: list of strings
+    """
+    parsed = []
+    for keyword in re.split(r'[,;]', keywords or ''):
+        keyword = ' '.join(keyword.split()).lower()[:128]
+        if keyword and keyword not in parsed:
+            parsed.append(keyword)
+    return parsed
+
+
+class Keyword(models.Model):
+    name = models.CharField(max_length=128, unique=True)
+    folded = models.CharField(max_length=128, db_index=True)
+    papers = models.ManyToManyField(Paper, through='PaperKeyword', related_name='keyword_set')
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def get_or_create_many(cls, names):
+        """
+        Returns Keyword objects for all given names, missing keywords are created
+        :param names: list of normalized keywords
+        :return: list of Keyword objects
+        """
+        if not names:
+            return []
+        cls.objects.bulk_create([cls(name=name, folded=fold_name(name)) for name in names], ignore_conflicts=True)
+        return list(cls.objects.filter(name__in=names))
+
+
+class PaperKeyword(models.Model):
+    paper = models.ForeignKey(Paper, on_delete=models.CASCADE)
+    keyword = models.ForeignKey(Keyword, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('paper', 'keyword')
+
+    @classmethod
+    def update_paper(cls, paper):
+        """
+        Synchronizes paper's keyword links with its keywords field
+        :param paper: Paper object
+        :return:
+        """
+        keywords = Keyword.get_or_create_many(parse_keywords(paper.keywords))
+        cls.objects.filter(paper=paper).exclude(keyword__in=keywords).delete()
+        cls.objects.bulk_create([cls(paper=paper, keyword=keyword) for keyword in keywords], ignore_conflicts=True)
+
+
+class AuthorSearchIndex(models.Model):
+    """
+    Folded names of paper's author and co-authors used by authors' filters,
+    author's row has coauthor set to None
+    """
+    paper = models.ForeignKey(Paper, related_name='author_index', on_delete=models.CASCADE)
+    coauthor = models.OneToOneField(CoAuthor, null=True, blank=True, on_delete=models.CASCADE)
+    first_name = models.CharField(max_length=150, db_index=True)
+    last_name = models.CharField(max_length=150, db_index=True)
+
+    def __str__(self):
+        return f'{self.first_name} {self.last_name} - {self.paper}'
+
+    @classmethod
+    def update_author(cls, paper):
+        cls.objects.update_or_create(paper=paper, coauthor=None, defaults={
+            'first_name': fold_name(paper.author.first_name),
+            'last_name': fold_name(paper.author.last_name),
+        })
+
+    @classmethod
+    def update_coauthor(cls, coauthor):
+        cls.objects.update_or_create(coauthor=coauthor, defaults={
+            'paper': coauthor.paper,
+            'first_name': fold_name(coauthor.name),
+            'last_name': fold_name(coauthor.surname),
+        })
+
+    @classmethod
+    def update_user(cls, user):
+        """
+        Updates folded names in rows of user's papers, rows with current names are not touched
+        :param user: User object
+        :return: integer (number of changed rows)
+        """
+        first_name, last_name = fold_name(user.first_name), fold_name(user.last_name)
+        return cls.objects.filter(paper__author=user, coauthor=None) \
+            .exclude(first_name=first_name, last_name=last_name) \
+            .update(first_name=first_name, last_name=last_name)
+
+
 def paper_directory_path(instance, filename):
     _filename = filename.split('.')
     filename = re.sub(r'\W+', '', _filename[0])
@@ -118,6 +259,16 @@ class Grade(models.Model):
         return f'[{self.tag}] {self.name}'
 
 
+class ReviewQuerySet(models.QuerySet):
+    def with_paper_list_data(self):
+        """
+        Loads reviewed papers together with everything displayed on paper's card
+        :return: Review queryset
+        """
+        return self.select_related('paper__author', 'paper__club').prefetch_related(
+            'paper__coauthor_set', 'paper__reviewers', 'paper__uploadedfile_set')
+
+
 class Review(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     paper = models.ForeignKey(Paper, on_delete=models.CASCADE)
@@ -135,6 +286,8 @@ class Review(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    objects = ReviewQuerySet.as_manager()
+
     def aggregate_grades(self):
         return self.correspondence, self.originality, self.merits, self.presentation, self.final_grade
 
@@ -142,6 +295,79 @@ class Review(models.Model):
         return f'[{self.author}] - {self.paper}'
 
 
+class PaperReviewSummary(models.Model):
+    """
+    Review state of a paper kept up to date on every Review write and reviewers assignment change,
+    only reviews written by reviewers assigned to the paper are taken into account
+    """
+    GRADED_FIELDS = ('correspondence', 'originality', 'merits', 'presentation', 'final_grade')
+
+    paper = models.OneToOneField(Paper, primary_key=True, related_name='review_summary', on_delete=models.CASCADE)
+    reviewers_count = models.PositiveIntegerField(default=0, db_index=True)
+    reviews_count = models.PositiveIntegerField(default=0, db_index=True)
+    # values of final grades separated and surrounded by commas, e.g. ',1,3,'
+    final_grades = models.CharField(max_length=64, blank=True, default='')
+    # the lowest value of final grade is the best one (1 - accept)
+    best_final_grade = models.PositiveSmallIntegerField(null=True, blank=True, db_index=True)
+    correspondence_avg = models.FloatField(null=True, blank=True)
+    originality_avg = models.FloatField(null=True, blank=True)
+    merits_avg = models.FloatField(null=True, blank=True)
+    presentation_avg = models.FloatField(null=True, blank=True)
+    final_grade_avg = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.paper} - {self.reviews_count} reviews'
+
+    @classmethod
+    def compute(cls, paper_id):
+        """
+        Computes review summary of the paper from reviews and reviewers tables
+        :param paper_id: integer
+        :return: dict of summary fields' values
+        """
+        reviews = Review.objects.filter(paper_id=paper_id, author__reviewers=paper_id) \
+            .select_related(*cls.GRADED_FIELDS)
+        values = {field: [] for field in cls.GRADED_FIELDS}
+        reviews_count = 0
+        for review in reviews:
+            reviews_count += 1
+            for field in cls.GRADED_FIELDS:
+                grade = getattr(review, field)
+                if grade is not None and str(grade.value).strip().isdigit():
+                    values[field].append(int(grade.value))
+
+        final_grades = sorted(values['final_grade'])
+        summary = {
+            'reviewers_count': Paper.reviewers.through.objects.filter(paper_id=paper_id).count(),
+            'reviews_count': reviews_count,
+            'final_grades': f',{",".join(str(value) for value in final_grades)},' if final_grades else '',
+            'best_final_grade': final_grades[0] if final_grades else None,
+        }
+        for field in cls.GRADED_FIELDS:
+            summary[f'{field}_avg'] = sum(values[field]) / len(values[field]) if values[field] else None
+        return summary
+
+    @classmethod
+    def update_for_paper(cls, paper_id, create=True):
+        """
+        Recomputes and saves review summary of the paper in a transaction
+        :param paper_id: integer
+        :param create: boolean (if False, summary is only updated when it already exists)
+        :return:
+        """
+        with transaction.atomic():
+            # lock the paper, so concurrent writes of reviews don't overwrite each other's summary
+            if not Paper.objects.select_for_update().filter(pk=paper_id).exists():
+                return
+            summary = cls.compute(paper_id)
+            summary['updated_at'] = timezone.now()
+            if create:
+                cls.objects.update_or_create(paper_id=paper_id, defaults=summary)
+            else:
+                cls.objects.filter(paper_id=paper_id).update(**summary)
+
+
 class Announcement(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
@@ -150,6 +376,29 @@ class Announcement(models.Model):
         return textwrap.shorten(self.text, width=20)
 
 
+class MessageQuerySet(models.QuerySet):
+    def of_participant(self, user):
+        """
+        Narrows messages to conversations the user takes part in: all conversations of user's papers
+        and conversations in which the user is the reviewer
+        :param user: User object
+        :return: Message queryset
+        """
+        return self.filter(Q(paper__author=user) | Q(reviewer=user))
+
+    def unread_by(self, user):
+        """
+        Narrows messages to those the user hasn't read yet, message is read when its id
+        is not greater than user's read cursor of the conversation, own messages are never unread
+        :param user: User object
+        :return: Message queryset
+        """
+        cursor = MessageReadCursor.objects.filter(reader=user, paper=OuterRef('paper'),
+                                                  reviewer=OuterRef('reviewer')).values('last_read_message_id')[:1]
+        return self.exclude(author=user).annotate(read_cursor=Coalesce(Subquery(cursor), 0)) \
+            .filter(pk__gt=F('read_cursor'))
+
+
 class Message(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     paper = models.ForeignKey(Paper, related_name='paper', default=None, on_delete=models.CASCADE)
@@ -157,22 +406,119 @@ class Message(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     text = models.TextField()
 
+    objects = MessageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # conversation is always read by id ranges
+            models.Index(fields=['paper', 'reviewer', 'id'], name='papers_message_conversation'),
+        ]
+
     def is_seen(self, user):
-        if MessageSeen.objects.filter(reader=user, message=self).count() > 0:
+        if self.author_id == user.pk:
             return True
-        return False
+        return MessageReadCursor.objects.filter(reader=user, paper=self.paper_id, reviewer=self.reviewer_id,
+                                                last_read_message_id__gte=self.pk).exists()
 
     def __str__(self):
         return f'[{self.author.username}][{self.created_at.strftime("%d-%m-%Y %H:%M")}]: {self.text[0:30]}'
 
 
-class MessageSeen(models.Model):
-    message = models.ForeignKey(Message, on_delete=models.CASCADE)
-    reader = models.ForeignKey(User, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(default=timezone.now)
+class MessageReadCursor(models.Model):
+    """
+    Id of the newest message of a conversation (paper, reviewer) that the reader has already read,
+    every message with greater id is unread
+    """
+    reader = models.ForeignKey(User, related_name='message_read_cursors', on_delete=models.CASCADE)
+    paper = models.ForeignKey(Paper, on_delete=models.CASCADE)
+    reviewer = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    last_read_message_id = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('reader', 'paper', 'reviewer')
 
     def __str__(self):
-        return f'{self.reader.username} seen: {self.message}'
+        return f'{self.reader.username} read {self.paper} ({self.reviewer.username}) up to {self.last_read_message_id}'
+
+    @classmethod
+    def advance(cls, reader, paper_id, reviewer_id, message_id):
+        """
+        Moves reader's cursor of the conversation forward to the given message with a single upsert,
+        cursor is never moved back
+        :param reader: User object
+        :param paper_id: integer
+        :param reviewer_id: integer
+        :param message_id: integer (id of the newest read message)
+        :return:
+        """
+        vendor = connection.vendor
+        if vendor not in ('sqlite', 'postgresql'):
+            cursor, created = cls.objects.get_or_create(reader=reader, paper_id=paper_id, reviewer_id=reviewer_id,
+                                                        defaults={'last_read_message_id': message_id})
+            if not created and cursor.last_read_message_id < message_id:
+                cls.objects.filter(pk=cursor.pk, last_read_message_id__lt=message_id) \
+                    .update(last_read_message_id=message_id, updated_at=timezone.now())
+            return
+
+        greatest = 'MAX' if vendor == 'sqlite' else 'GREATEST'
+        table = cls._meta.db_table
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(
+                f'INSERT INTO {table} (reader_id, paper_id, reviewer_id, last_read_message_id, updated_at) '
+                f'VALUES (%s, %s, %s, %s, %s) '
+                f'ON CONFLICT (reader_id, paper_id, reviewer_id) DO UPDATE SET '
+                f'last_read_message_id = {greatest}({table}.last_read_message_id, excluded.last_read_message_id), '
+                f'updated_at = excluded.updated_at',
+                [reader.pk, paper_id, reviewer_id, message_id, timezone.now()])
+
+
+class ArchivedConversation(models.Model):
+    """
+    Messages of a conversation (paper, reviewer) moved out of Message table, stored as compressed JSON,
+    every archived message has lower id than messages of the conversation left in Message table
+    """
+    paper = models.ForeignKey(Paper, related_name='archived_conversations', on_delete=models.CASCADE)
+    reviewer = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    first_message_id = models.PositiveIntegerField()
+    last_message_id = models.PositiveIntegerField()
+    messages_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['paper', 'reviewer', 'last_message_id'], name='papers_archive_conversation'),
+        ]
+
+    def __str__(self):
+        return f'{self.paper} ({self.reviewer.username}) - {self.messages_count} messages'
+
+    @staticmethod
+    def pack(messages):
+        """
+        Compresses messages for storing in the archive
+        :param messages: iterable of Message objects (with author loaded) ordered by id
+        :return: bytes
+        """
+        return zlib.compress(json.dumps([
+            [message.pk, message.author_id, message.author.username, message.author.first_name,
+             message.author.last_name, message.created_at.isoformat(), message.text] for message in messages
+        ], ensure_ascii=False).encode('utf-8'), 9)
+
+    def unpack(self):
+        """
+        Restores archived messages, they are not saved in the database
+        :return: list of Message objects ordered by id
+        """
+        messages = []
+        for pk, author_id, username, first_name, last_name, created_at, text in json.loads(
+                zlib.decompress(bytes(self.data)).decode('utf-8')):
+            message = Message(pk=pk, paper_id=self.paper_id, reviewer_id=self.reviewer_id, text=text,
+                              created_at=datetime.fromisoformat(created_at), author_id=author_id)
+            message.author = User(pk=author_id, username=username, first_name=first_name, last_name=last_name)
+            messages.append(message)
+        return messages
 
 
 def delete_file_with_object(instance, **kwargs):
@@ -0,0 +1,129 @@
+from django.db.models import Exists, OuterRef, Q
+
+from users.roles import is_reviewer
+from .models import Paper, Review
+
+# name of the annotation telling whether the requesting user is assigned as a reviewer of the paper
+IS_PAPER_REVIEWER = 'is_paper_reviewer'
+
+
+def annotate_paper_reviewer(queryset, user, paper_field='pk'):
+    """
+    Annotates objects with information whether the user is assigned as a reviewer of the (related) paper,
+    so permission checks don't need additional queries
+    :param queryset: queryset of Paper or a model related to a paper
+    :param user: User object
+    :param paper_field: string (name of the field pointing to the paper)
+    :return: queryset
+    """
+    assigned = Paper.reviewers.through.objects.filter(paper=OuterRef(paper_field), user=user.pk)
+    return queryset.annotate(**{IS_PAPER_REVIEWER: Exists(assigned)})
+
+
+def _is_paper_reviewer(user, paper, annotated=None):
+    value = getattr(annotated if annotated is not None else paper, IS_PAPER_REVIEWER, None)
+    if value is None:
+        return paper.reviewers.filter(pk=user.pk).exists()
+    return value
+
+
+def can_view_paper(user, paper):
+    return user.is_staff or user.pk == paper.author_id or is_reviewer(user)
+
+
+def can_edit_paper(user, paper):
+    return user.pk == paper.author_id
+
+
+def can_access_messages(user, paper):
+    """
+    Checks if the user can read and write messages of the paper
+    :param user: User object
+    :param paper: Paper object (preferably annotated with annotate_paper_reviewer)
+    :return: boolean
+    """
+    if paper is None or not user.is_authenticated:
+        return False
+    return user.is_staff or user.pk == paper.author_id or _is_paper_reviewer(user, paper)
+
+
+def can_view_review(user, review):
+    """
+    Checks if the user can see the review
+    :param user: User object
+    :param review: Review object (preferably loaded with review_queryset)
+    :return: boolean
+    """
+    if user.is_staff or user.pk in (review.author_id, review.paper.author_id):
+        return True
+    return is_reviewer(user) and _is_paper_reviewer(user, review.paper, annotated=review)
+
+
+def can_edit_review(user, review):
+    return user.pk == review.author_id
+
+
+def can_add_review(user, paper):
+    """
+    Checks if the user can add a review of the paper
+    :param user: User object
+    :param paper: Paper object (preferably loaded with paper_queryset)
+    :return: boolean
+    """
+    if user.pk == paper.author_id or (is_reviewer(user) and not user.is_staff):
+        return False
+    if paper.review_set.filter(author=user.pk).exists():
+        return False
+    return _is_paper_reviewer(user, paper)
+
+
+def can_view_document(user, document):
+    return user.is_staff or user.pk == document.author_id or is_reviewer(user)
+
+
+def can_edit_document(user, document):
+    return user.pk == document.author_id
+
+
+def paper_queryset(user):
+    """
+    Returns queryset used to fetch a single paper together with everything permission checks need
+    :param user: User object
+    :return: Paper queryset
+    """
+    return annotate_paper_reviewer(Paper.objects.all(), user)
+
+
+def review_queryset(user):
+    return annotate_paper_reviewer(Review.objects.select_related('paper'), user, paper_field='paper')
+
+
+def papers_with_message_access(user, queryset=None):
+    queryset = Paper.objects.all() if queryset is None else queryset
+    if user.is_staff:
+        return queryset
+    return annotate_paper_reviewer(queryset, user).filter(Q(author=user.pk) | Q(**{IS_PAPER_REVIEWER: True}))
+
+
+def viewable_reviews(user, queryset=None):
+    queryset = Review.objects.all() if queryset is None else queryset
+    if user.is_staff:
+        return queryset
+    condition = Q(author=user.pk) | Q(paper__author=user.pk)
+    if is_reviewer(user):
+        queryset = annotate_paper_reviewer(queryset, user, paper_field='paper')
+        condition |= Q(**{IS_PAPER_REVIEWER: True})
+    return queryset.filter(condition)
+
+
+class MemoizedObjectMixin:
+    """
+    Fetches view's object only once per request, test_func, get and get_context_data share the same object
+    """
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, '_memoized_object'):
+            self._memoized_object = super().get_object()
+        return self._memoized_object
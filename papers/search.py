@@ -0,0 +1,188 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import fold_name
+
+SEARCH_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def paper_document(title, keywords, description):
+    """
+    Prepares texts of a paper for indexing, summernote HTML is stripped and names are folded
+    :return: tuple of strings (title, keywords, description)
+    """
+    return fold_name(title), fold_name(keywords), fold_name(strip_tags(description or ''))
+
+
+def search_terms(query):
+    """
+    Splits user's query into folded words
+    :param query: string
+    :return: list of strings
+    """
+    return SEARCH_TERM_RE.findall(fold_name(query))
+
+
+class SQLiteSearchBackend:
+    """
+    Full text search backed by FTS5 virtual table, rowid of the table is paper's id
+    """
+    table = 'papers_paper_fts'
+
+    def create(self, cursor):
+        cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+                       f'USING fts5(title, keywords, description, tokenize="unicode61 remove_diacritics 2")')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def update(self, cursor, pk, title, keywords, description):
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+        cursor.execute(f'INSERT INTO {self.table} (rowid, title, keywords, description) VALUES (%s, %s, %s, %s)',
+                       [pk, *paper_document(title, keywords, description)])
+
+    def remove(self, cursor, pk):
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {self.table}')
+
+    def match_query(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def matching_sql(self, terms):
+        return f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [self.match_query(terms)]
+
+    def ranked_sql(self, terms):
+        # title is the most important column, then keywords and description
+        return (f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, 10.0, 5.0, 1.0)'), [self.match_query(terms)]
+
+
+class PostgreSQLSearchBackend:
+    """
+    Full text search backed by tsvector column with GIN index
+    """
+    table = 'papers_paper_search'
+
+    def create(self, cursor):
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                       f'paper_id integer PRIMARY KEY REFERENCES papers_paper (id) ON DELETE CASCADE, '
+                       f'document tsvector NOT NULL)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_document_gin ON {self.table} USING GIN (document)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def update(self, cursor, pk, title, keywords, description):
+        cursor.execute(f'INSERT INTO {self.table} (paper_id, document) VALUES (%s, '
+                       f"setweight(to_tsvector('simple', %s), 'A') || "
+                       f"setweight(to_tsvector('simple', %s), 'B') || "
+                       f"setweight(to_tsvector('simple', %s), 'D')) "
+                       f'ON CONFLICT (paper_id) DO UPDATE SET document = EXCLUDED.document',
+                       [pk, *paper_document(title, keywords, description)])
+
+    def remove(self, cursor, pk):
+        cursor.execute(f'DELETE FROM {self.table} WHERE paper_id = %s', [pk])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {self.table}')
+
+    def match_query(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def matching_sql(self, terms):
+        return (f"SELECT paper_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s)",
+                [self.match_query(terms)])
+
+    def ranked_sql(self, terms):
+        return (f"SELECT paper_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s) "
+                f"ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC"), [self.match_query(terms)] * 2
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+
+def get_backend(conn=None):
+    """
+    Returns search backend for the database vendor or None if full text search is not supported
+    :param conn: database connection (default connection if not given)
+    :return: backend object or None
+    """
+    backend = BACKENDS.get((conn or connection).vendor)
+    return backend() if backend is not None else None
+
+
+def index_paper(paper):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.update(cursor, paper.pk, paper.title, paper.keywords, paper.description)
+
+
+def unindex_paper(pk):
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.remove(cursor, pk)
+
+
+def rebuild_index(papers):
+    """
+    Removes all entries from the search index and indexes given papers again
+    :param papers: Paper queryset
+    :return: integer (number of indexed papers)
+    """
+    backend = get_backend()
+    if backend is None:
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        for pk, title, keywords, description in papers.values_list('pk', 'title', 'keywords',
+                                                                    'description').iterator():
+            backend.update(cursor, pk, title, keywords, description)
+            count += 1
+    return count
+
+
+def filter_papers(queryset, query):
+    """
+    Narrows Paper queryset to papers matching the query
+    :param queryset: Paper queryset
+    :param query: string
+    :return: Paper queryset
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    backend = get_backend()
+    if backend is None:
+        for term in terms:
+            queryset = queryset.filter(title__icontains=term) | queryset.filter(keywords__icontains=term) \
+                       | queryset.filter(description__icontains=term)
+        return queryset.distinct()
+    sql, params = backend.matching_sql(terms)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def ranked_ids(query):
+    """
+    Returns ids of papers matching the query, most relevant first
+    :param query: string
+    :return: list of integers or None if ranking is not supported
+    """
+    terms = search_terms(query)
+    backend = get_backend()
+    if not terms or backend is None:
+        return None
+    sql, params = backend.ranked_sql(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
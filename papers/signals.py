@@ -0,0 +1,244 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import search
+from .cache import bump_data_version, bump_card_versions
+from .models import Paper, CoAuthor, Review, AuthorSearchIndex, PaperKeyword, UploadedFile, StudentClub, Grade, \
+    PaperReviewSummary
+
+# fields of User displayed with papers and used by authors' filters
+USER_NAME_FIELDS = frozenset(('first_name', 'last_name'))
+
+
+@receiver(post_save, sender=Paper)
+@receiver(post_delete, sender=Paper)
+@receiver(post_save, sender=CoAuthor)
+@receiver(post_delete, sender=CoAuthor)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_papers_data(sender, **kwargs):
+    """
+    Invalidates cached filter results when papers or objects used by filters change
+    :param sender: model class
+    :param kwargs:
+    :return:
+    """
+    bump_data_version()
+
+
+@receiver(m2m_changed, sender=Paper.reviewers.through)
+def invalidate_papers_reviewers(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_data_version()
+
+
+@receiver(post_save, sender=Paper)
+def index_paper_author(sender, instance, **kwargs):
+    """
+    Keeps folded name of paper's author in authors' search index
+    :param sender: Paper class
+    :param instance: Paper object that was saved
+    :param kwargs:
+    :return:
+    """
+    AuthorSearchIndex.update_author(instance)
+
+
+@receiver(post_save, sender=CoAuthor)
+def index_coauthor(sender, instance, **kwargs):
+    AuthorSearchIndex.update_coauthor(instance)
+
+
+@receiver(post_save, sender=User)
+def index_user_papers(sender, instance, created, update_fields, **kwargs):
+    """
+    Updates folded names of the user in authors' search index, cached filter results are invalidated
+    only when a name has really changed (e.g. not when last_login is saved on every login)
+    :param sender: User class
+    :param instance: User object that was saved
+    :param created: boolean
+    :param update_fields: frozenset of saved fields' names or None (all fields)
+    :param kwargs:
+    :return:
+    """
+    if created or (update_fields is not None and not USER_NAME_FIELDS.intersection(update_fields)):
+        return
+    if AuthorSearchIndex.update_user(instance):
+        bump_data_version()
+
+
+@receiver(post_save, sender=Paper)
+def index_paper_text(sender, instance, **kwargs):
+    """
+    Updates full text search index entry of the saved paper
+    :param sender: Paper class
+    :param instance: Paper object that was saved
+    :param kwargs:
+    :return:
+    """
+    search.index_paper(instance)
+
+
+@receiver(post_delete, sender=Paper)
+def unindex_paper_text(sender, instance, **kwargs):
+    search.unindex_paper(instance.pk)
+
+
+@receiver(post_save, sender=Paper)
+def update_paper_keywords(sender, instance, **kwargs):
+    """
+    Parses paper's keywords into normalized Keyword/PaperKeyword structure
+    :param sender: Paper class
+    :param instance: Paper object that was saved
+    :param kwargs:
+    :return:
+    """
+    PaperKeyword.update_paper(instance)
+
+
+@receiver(post_save, sender=Paper)
+@receiver(post_delete, sender=Paper)
+def invalidate_paper_card(sender, instance, **kwargs):
+    """
+    Invalidates cached card of the paper displayed on papers list
+    :param sender: Paper class
+    :param instance: Paper object that was changed
+    :param kwargs:
+    :return:
+    """
+    bump_card_versions('paper', [instance.pk])
+
+
+@receiver(post_save, sender=CoAuthor)
+@receiver(post_delete, sender=CoAuthor)
+@receiver(post_save, sender=UploadedFile)
+@receiver(post_delete, sender=UploadedFile)
+def invalidate_related_paper_card(sender, instance, **kwargs):
+    bump_card_versions('paper', [instance.paper_id])
+
+
+@receiver(m2m_changed, sender=Paper.reviewers.through)
+def invalidate_reviewed_paper_card(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_card_versions('paper', [instance.pk])
+    elif action == 'pre_clear':
+        # pk_set is not provided on clear, so papers of the reviewer are collected before clearing
+        bump_card_versions('paper', instance.reviewers.values_list('pk', flat=True))
+    elif pk_set:
+        bump_card_versions('paper', pk_set)
+
+
+@receiver(post_init, sender=User)
+def remember_user_names(sender, instance, **kwargs):
+    # deferred fields are not read, it would query the database for every loaded user
+    instance._saved_names = (instance.__dict__.get('first_name'), instance.__dict__.get('last_name'))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_papers_cards(sender, instance, created, update_fields, **kwargs):
+    """
+    Invalidates cards of papers which display user's name, only when the name has changed
+    :param sender: User class
+    :param instance: User object that was saved
+    :param created: boolean
+    :param update_fields: frozenset of saved fields' names or None (all fields)
+    :param kwargs:
+    :return:
+    """
+    names = (instance.first_name, instance.last_name)
+    if created or (update_fields is not None and not USER_NAME_FIELDS.intersection(update_fields)) \
+            or names == getattr(instance, '_saved_names', None):
+        return
+    instance._saved_names = names
+    papers = Paper.objects.filter(Q(author=instance) | Q(reviewers=instance)).values_list('pk', flat=True)
+    bump_card_versions('paper', set(papers))
+
+
+@receiver(post_save, sender=StudentClub)
+def invalidate_club_papers_cards(sender, instance, created, **kwargs):
+    if not created:
+        bump_card_versions('paper', instance.paper_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Paper)
+def create_paper_review_summary(sender, instance, created, **kwargs):
+    """
+    Creates empty review summary for a new paper, so filters can rely on its existence
+    :param sender: Paper class
+    :param instance: Paper object that was saved
+    :param created: boolean
+    :param kwargs:
+    :return:
+    """
+    if created:
+        PaperReviewSummary.objects.get_or_create(paper=instance)
+
+
+@receiver(post_save, sender=Review)
+def update_paper_review_summary(sender, instance, **kwargs):
+    PaperReviewSummary.update_for_paper(instance.paper_id)
+
+
+@receiver(post_delete, sender=Review)
+def update_paper_review_summary_on_delete(sender, instance, **kwargs):
+    # when the whole paper is being deleted its summary may be already gone, so it is not recreated
+    PaperReviewSummary.update_for_paper(instance.paper_id, create=False)
+
+
+@receiver(m2m_changed, sender=Paper.reviewers.through)
+def update_reviewed_papers_summaries(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # pk_set is not provided on clear, so papers of the reviewer are remembered before clearing
+        instance._cleared_reviewed_papers = list(instance.reviewers.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        papers = [instance.pk]
+    elif action == 'post_clear':
+        papers = getattr(instance, '_cleared_reviewed_papers', [])
+    else:
+        papers = pk_set or []
+    for paper_id in papers:
+        PaperReviewSummary.update_for_paper(paper_id)
+
+
+def get_graded_papers(grade):
+    """
+    Returns papers having reviews with the given grade in any category
+    :param grade: Grade object
+    :return: set of integers (ids of papers)
+    """
+    return set(Review.objects.filter(Q(correspondence=grade) | Q(originality=grade) | Q(merits=grade) |
+                                     Q(presentation=grade) | Q(final_grade=grade)).values_list('paper', flat=True))
+
+
+@receiver(post_save, sender=Grade)
+def update_graded_papers_summaries(sender, instance, created, **kwargs):
+    if created:
+        return
+    papers = get_graded_papers(instance)
+    for paper_id in papers:
+        PaperReviewSummary.update_for_paper(paper_id)
+    if papers:
+        # summaries are used by filters, so their cached results are invalidated
+        bump_data_version()
+
+
+@receiver(pre_delete, sender=Grade)
+def remember_graded_papers(sender, instance, **kwargs):
+    # reviews lose the grade (SET_NULL) before post_delete, so their papers are remembered before deleting
+    instance._graded_papers = get_graded_papers(instance)
+
+
+@receiver(post_delete, sender=Grade)
+def update_graded_papers_summaries_on_delete(sender, instance, **kwargs):
+    papers = getattr(instance, '_graded_papers', ())
+    for paper_id in papers:
+        PaperReviewSummary.update_for_paper(paper_id)
+    if papers:
+        bump_data_version()
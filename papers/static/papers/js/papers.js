@@ -1,13 +1,15 @@
 $().ready(function () {
     CanGetMessage = false;
-    setInterval(GetMessage, GetMessageInterval);
+    setInterval(PollMessages, GetMessageInterval);
 
     $(".message_link").on('click', function (event) {
         $("#messages_box").html('');
+        CloseMessageStream();
         ReviewerId = $(this).attr('data-reviewer');
         CanGetMessage = true;
         LastMessageId = -1;
-        GetMessage();
+        OlderMessagesId = null;
+        GetMessage(OpenMessageStream);
         RenderMessages();
     });
 
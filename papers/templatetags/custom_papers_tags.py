@@ -1,6 +1,8 @@
 from django import template
-from django.contrib.auth.models import Group
-from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from papers.cache import get_card
+from users import roles
 
 register = template.Library()
 
@@ -8,18 +10,12 @@ register = template.Library()
 @register.filter(name='is_in_group')
 def is_in_group(user, group_name):
     """
-    Checks if given user is in a group of the given name
+    Checks if given user is in a group of the given name, groups are resolved once per request
     :param user: User object
     :param group_name: string (name of a group)
     :return: boolean
     """
-    try:
-        group = Group.objects.get(name=group_name)
-        if group in user.groups.all():
-            return True
-    except:
-        return False
-    return False
+    return roles.is_in_group(user, group_name)
 
 
 @register.filter(name='already_reviewed')
@@ -86,6 +82,9 @@ def addstr(arg1, arg2):
 def print_paper(paper, link, user):
     context = dict()
     context['paper'] = paper
-    context['link'] = link
     context['user'] = user
-    return render_to_string('papers/paper_list_element.html', context=context)
+    variant = 'staff' if user.is_staff else 'user'
+    # link and number of unread messages differ between requests, so they are inserted into the cached card
+    html = get_card('paper', paper.pk, variant, 'papers/paper_list_element.html', context,
+                    {'link': link, 'unread_messages': getattr(paper, 'unread_messages_count', 0)})
+    return mark_safe(html)
@@ -1 +1,517 @@
-# Create your tests here.
+import csv
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User, Group, update_last_login
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from mailing.models import OutgoingEmail
+from . import admin, permissions, search
+from .cache import DATA_VERSION_KEY, get_data_version, get_card_version, get_filter_token
+from .filters import PaperFilter
+from .models import Paper, Review, CoAuthor, UploadedFile, Message, MessageReadCursor, AuthorSearchIndex, Grade, \
+    PaperReviewSummary
+from .templatetags.custom_papers_tags import print_paper
+
+
+class ReviewsCountFilterTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.other = User.objects.create(username='other')
+
+    def create_papers(self, count):
+        for i in range(count):
+            paper = Paper.objects.create(title=f'Paper {i}', author=self.author, keywords='', description='')
+            paper.reviewers.add(self.reviewer)
+            Review.objects.create(author=self.reviewer, paper=paper, text='')
+            # review written by a user that is not assigned to the paper is not counted
+            Review.objects.create(author=self.other, paper=paper, text='')
+
+    def test_counts_only_reviews_of_assigned_reviewers(self):
+        self.create_papers(1)
+        unreviewed = Paper.objects.create(title='Unreviewed', author=self.author, keywords='', description='')
+
+        one = PaperFilter({'reviews_count': '1'}, queryset=Paper.objects.all()).qs
+        none = PaperFilter({'reviews_count': '0'}, queryset=Paper.objects.all()).qs
+        two = PaperFilter({'reviews_count': '2'}, queryset=Paper.objects.all()).qs
+
+        self.assertEqual(list(one.values_list('title', flat=True)), ['Paper 0'])
+        self.assertEqual(list(none), [unreviewed])
+        self.assertFalse(two.exists())
+
+    def test_reviewers_check(self):
+        self.create_papers(2)
+        Paper.objects.create(title='Unassigned', author=self.author, keywords='', description='')
+
+        qs = PaperFilter({'reviewers_field': '0'}, queryset=Paper.objects.all()).qs
+        self.assertEqual(list(qs.values_list('title', flat=True)), ['Unassigned'])
+        qs = PaperFilter({'reviewers_field': '1', 'reviews_count': '1'}, queryset=Paper.objects.all()).qs
+        self.assertEqual(qs.count(), 2)
+
+    def test_query_count_does_not_depend_on_papers_number(self):
+        for papers_number in (1, 20):
+            Paper.objects.all().delete()
+            self.create_papers(papers_number)
+            with self.assertNumQueries(1):
+                papers = list(PaperFilter({'reviews_count': '1', 'reviewers_field': '1'},
+                                          queryset=Paper.objects.all()).qs)
+            self.assertEqual(len(papers), papers_number)
+
+
+class PaperSearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+
+    def test_search_matches_stripped_description_without_diacritics(self):
+        paper = Paper.objects.create(title='Sterowanie robotem', author=self.author, keywords='robotyka',
+                                     description='<p>Układ <b>żyroskopu</b></p>')
+        Paper.objects.create(title='Inny', author=self.author, keywords='', description='<p>bold</p>')
+
+        self.assertEqual(list(PaperFilter({'search': 'zyroskop'}, queryset=Paper.objects.all()).qs), [paper])
+        self.assertFalse(PaperFilter({'search': 'bold b'}, queryset=Paper.objects.all()).qs.filter(pk=paper.pk))
+
+    def test_search_ranks_title_matches_first(self):
+        in_description = Paper.objects.create(title='Inny', author=self.author, keywords='',
+                                              description='<p>dron</p>')
+        in_title = Paper.objects.create(title='Dron', author=self.author, keywords='', description='')
+
+        search_filter = PaperFilter({'search': 'dron'}, queryset=Paper.objects.all())
+        self.assertEqual(set(search_filter.qs), {in_title, in_description})
+        self.assertEqual(search_filter.search_ranking, [in_title.pk, in_description.pk])
+
+    def test_deleted_paper_is_removed_from_index(self):
+        paper = Paper.objects.create(title='Dron', author=self.author, keywords='', description='')
+        paper.delete()
+        self.assertEqual(search.ranked_ids('dron'), [])
+
+
+class PaperListQueriesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.reviewer.groups.add(Group.objects.create(name='reviewer'))
+
+    def create_papers(self, count):
+        for i in range(count):
+            paper = Paper.objects.create(title=f'Paper {i}', author=self.author, keywords='', description='')
+            paper.reviewers.add(self.reviewer)
+            CoAuthor.objects.create(name='Jan', surname='Kowalski', paper=paper)
+            UploadedFile.objects.create(paper=paper, file='paper_files/file.pdf')
+            Review.objects.create(author=self.reviewer, paper=paper, text='')
+
+    def count_queries(self, user, url):
+        self.client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_paper_list_queries_do_not_depend_on_page_size(self):
+        self.create_papers(1)
+        one_paper = self.count_queries(self.author, reverse('paperList'))
+        self.create_papers(4)
+        self.assertEqual(self.count_queries(self.author, reverse('paperList')), one_paper)
+
+    def test_review_list_queries_do_not_depend_on_reviews_number(self):
+        self.create_papers(1)
+        one_review = self.count_queries(self.reviewer, reverse('reviewList'))
+        self.create_papers(4)
+        self.assertEqual(self.count_queries(self.reviewer, reverse('reviewList')), one_review)
+
+
+class PermissionsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.other_reviewer = User.objects.create(username='other')
+        group = Group.objects.create(name='reviewer')
+        self.reviewer.groups.add(group)
+        self.other_reviewer.groups.add(group)
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+        self.review = Review.objects.create(author=self.reviewer, paper=self.paper, text='')
+
+    def test_review_permissions_match_bulk_form(self):
+        for user in (self.author, self.reviewer, self.other_reviewer):
+            user = User.objects.get(pk=user.pk)
+            expected = permissions.viewable_reviews(user).filter(pk=self.review.pk).exists()
+            review = permissions.review_queryset(user).get(pk=self.review.pk)
+            with self.assertNumQueries(0):
+                self.assertEqual(permissions.can_view_review(user, review), expected)
+        self.assertFalse(expected)
+
+    def test_review_link_shows_only_viewable_review(self):
+        url = reverse('reviewShow', args=[self.paper.pk, self.reviewer.pk])
+        self.client.force_login(self.author)
+        self.assertRedirects(self.client.get(url), reverse('reviewDetail', args=[self.review.pk]),
+                             fetch_redirect_response=False)
+        self.client.force_login(self.other_reviewer)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_detail_view_fetches_paper_once(self):
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('paperDetail', args=[self.paper.pk]))
+        fetches = [query for query in queries if 'FROM "papers_paper"' in query['sql']
+                   and 'WHERE "papers_paper"."id" =' in query['sql']]
+        self.assertEqual(len(fetches), 1)
+
+
+class MessageReadCursorTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+        self.messages = [Message.objects.create(author=self.reviewer, paper=self.paper, reviewer=self.reviewer,
+                                                text=str(i)) for i in range(3)]
+        Message.objects.create(author=self.author, paper=self.paper, reviewer=self.reviewer, text='own')
+
+    def test_cursor_is_upserted_and_never_moves_back(self):
+        with self.assertNumQueries(1):
+            MessageReadCursor.advance(self.author, self.paper.pk, self.reviewer.pk, self.messages[1].pk)
+        MessageReadCursor.advance(self.author, self.paper.pk, self.reviewer.pk, self.messages[0].pk)
+        cursor = MessageReadCursor.objects.get()
+        self.assertEqual(cursor.last_read_message_id, self.messages[1].pk)
+
+    def test_unread_messages_are_newer_than_cursor(self):
+        self.assertEqual(Paper.get_unread_messages_counts([self.paper], self.author), {self.paper.pk: 3})
+        MessageReadCursor.advance(self.author, self.paper.pk, self.reviewer.pk, self.messages[1].pk)
+        self.assertEqual(Paper.get_unread_messages_counts([self.paper], self.author), {self.paper.pk: 1})
+        self.assertEqual(self.paper.get_unread_messages(self.author), [self.messages[2]])
+        self.assertTrue(self.messages[1].is_seen(self.author))
+        self.assertFalse(self.messages[2].is_seen(self.author))
+
+
+class MassEmailTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+        for number in range(5):
+            author = User.objects.create(username=f'author{number}', email=f'author{number}@example.com')
+            Paper.objects.create(title='Paper', author=author, keywords='', description='', approved=number < 3)
+            Paper.objects.create(title='Paper', author=author, keywords='', description='', approved=number < 3)
+        self.client.force_login(self.admin)
+
+    def post(self, **data):
+        data.update({'subject': 'Temat', 'recipients': '2', 'content': '<p>Treść</p>'})
+        return self.client.post(reverse('admin:papers_massemailmodel_changelist'), data)
+
+    def test_recipients_are_previewed_and_sent_in_chunks(self):
+        with mock.patch.object(admin, 'MAILING_BCC_CHUNK_SIZE', 2):
+            response = self.post()
+            self.assertEqual(response.context['preview'], {'recipients': 3, 'messages': 2})
+            self.assertFalse(OutgoingEmail.objects.exists())
+
+            self.post(confirm='1')
+        self.assertEqual(sorted(email.bcc for email in OutgoingEmail.objects.all()),
+                         [['author0@example.com', 'author1@example.com'], ['author2@example.com']])
+
+
+class AuthorSearchIndexTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author', first_name='Jan', last_name='Żółw')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+
+    def test_index_is_updated_only_when_name_changes(self):
+        version = get_data_version()
+        update_last_login(None, self.author)
+        self.author.save()
+        self.assertEqual(get_data_version(), version)
+
+        self.author.last_name = 'Łoś'
+        self.author.save()
+        self.assertNotEqual(get_data_version(), version)
+        self.assertEqual(list(AuthorSearchIndex.objects.values_list('first_name', 'last_name')), [('jan', 'los')])
+
+
+class PaperCardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='author', first_name='Jan', last_name='Kowalski')
+        self.reviewer = User.objects.create(username='reviewer', first_name='Anna', last_name='Nowak')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+
+    def test_card_is_invalidated_only_when_displayed_name_changes(self):
+        version = get_card_version('paper', self.paper.pk)
+        update_last_login(None, self.reviewer)
+        User.objects.get(pk=self.reviewer.pk).save()
+        self.assertEqual(get_card_version('paper', self.paper.pk), version)
+
+        self.reviewer.last_name = 'Kowalska'
+        self.reviewer.save()
+        self.assertNotEqual(get_card_version('paper', self.paper.pk), version)
+
+    def test_card_is_rendered_once_and_request_values_are_inserted(self):
+        self.paper.unread_messages_count = 2
+        with mock.patch('papers.cache.render_to_string', wraps=render_to_string) as render:
+            first = print_paper(self.paper, '?page=1', self.reviewer)
+            self.paper.unread_messages_count = 5
+            second = print_paper(self.paper, '?page=2&a=<b>', self.reviewer)
+        self.assertEqual(render.call_count, 1)
+        self.assertIn('?page=1', first)
+        self.assertIn('?page=2&amp;a=&lt;b&gt;', second)
+        self.assertIn('5', second)
+
+    def test_card_content_is_not_mistaken_for_placeholders(self):
+        self.paper.description = '__card_link__ {{ link }} unread_messages'
+        self.paper.save()
+        html = print_paper(self.paper, '?page=1', self.reviewer)
+        self.assertIn('__card_link__ {{ link }} unread_messages', html)
+
+    def test_card_is_rendered_again_after_paper_changes(self):
+        print_paper(self.paper, '', self.reviewer)
+        self.paper.title = 'Changed title'
+        self.paper.save()
+        self.assertIn('Changed title', print_paper(self.paper, '', self.reviewer))
+
+
+class AuthorFilterTest(TestCase):
+    def setUp(self):
+        self.kowalski = Paper.objects.create(title='A', author=User.objects.create(username='a', last_name='Kowalski'),
+                                             keywords='', description='')
+        self.paper = Paper.objects.create(title='B', author=User.objects.create(username='b', last_name='Nowak'),
+                                          keywords='', description='')
+        CoAuthor.objects.create(name='Jan', surname='Kołodziej', paper=self.paper)
+
+    def filter(self, surnames):
+        return set(PaperFilter({'author_surname': surnames}, queryset=Paper.objects.all()).qs)
+
+    def test_surnames_are_matched_by_folded_prefix(self):
+        self.assertEqual(self.filter('ko'), {self.kowalski, self.paper})
+        self.assertEqual(self.filter('KOŁO'), {self.paper})
+        self.assertEqual(self.filter('owal'), set())
+
+    def test_surname_filter_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('query plan is checked only on SQLite')
+        sql, params = PaperFilter({'author_surname': 'kow'}, queryset=Paper.objects.all()).qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX papers_authorsearchindex_last_name', plan)
+
+
+class KeywordsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author', is_staff=True)
+        self.robots = Paper.objects.create(title='A', author=self.author, description='',
+                                           keywords='Robotyka; sieci  neuronowe')
+        self.energy = Paper.objects.create(title='B', author=self.author, description='',
+                                           keywords='energia słoneczna, robotyka')
+        self.other = Paper.objects.create(title='C', author=self.author, description='', keywords='Żuraw')
+
+    def filter(self, keywords):
+        return set(PaperFilter({'keywords': keywords}, queryset=Paper.objects.all()).qs)
+
+    def test_keywords_are_normalized(self):
+        self.assertEqual(sorted(self.robots.keyword_set.values_list('name', flat=True)),
+                         ['robotyka', 'sieci neuronowe'])
+        self.energy.keywords = 'energia słoneczna'
+        self.energy.save()
+        self.assertEqual(list(self.energy.keyword_set.values_list('name', flat=True)), ['energia słoneczna'])
+
+    def test_papers_are_filtered_by_keyword_prefixes(self):
+        self.assertEqual(self.filter('robot'), {self.robots, self.energy})
+        self.assertEqual(self.filter('SIECI,zuraw'), {self.robots, self.other})
+        self.assertEqual(self.filter('neuronowe'), set())
+
+    def test_popular_keywords_are_counted(self):
+        self.client.force_login(self.author)
+        keywords = self.client.get(reverse('paperList')).context['popular_keywords']
+        self.assertEqual([(keyword.name, keyword.papers_count) for keyword in keywords][:2],
+                         [('robotyka', 2), ('energia słoneczna', 1)])
+
+
+class PaperReviewSummaryTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author')
+        self.reviewer = User.objects.create(username='reviewer')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.accept = Grade.objects.create(name='Akceptacja', value='1', tag='final_grade')
+        self.reject = Grade.objects.create(name='Odrzucenie', value='3', tag='final_grade')
+
+    def get_summary(self):
+        return PaperReviewSummary.objects.get(paper=self.paper)
+
+    def test_summary_follows_reviewers_and_reviews(self):
+        self.assertEqual(self.get_summary().reviewers_count, 0)
+        self.paper.reviewers.add(self.reviewer)
+        review = Review.objects.create(author=self.reviewer, paper=self.paper, text='', final_grade=self.reject)
+        summary = self.get_summary()
+        self.assertEqual((summary.reviewers_count, summary.reviews_count, summary.best_final_grade), (1, 1, 3))
+
+        review.final_grade = self.accept
+        review.save()
+        self.assertEqual(self.get_summary().best_final_grade, 1)
+
+        self.reviewer.reviewers.clear()
+        summary = self.get_summary()
+        self.assertEqual((summary.reviewers_count, summary.reviews_count, summary.best_final_grade), (0, 0, None))
+
+    def test_summary_follows_grade_changes(self):
+        self.paper.reviewers.add(self.reviewer)
+        Review.objects.create(author=self.reviewer, paper=self.paper, text='', final_grade=self.reject)
+
+        # cached filter results depend on summaries
+        version = get_data_version()
+        self.reject.value = '2'
+        self.reject.save()
+        self.assertEqual(self.get_summary().final_grades, ',2,')
+        self.assertNotEqual(get_data_version(), version)
+
+        version = get_data_version()
+        self.reject.delete()
+        summary = self.get_summary()
+        self.assertEqual((summary.final_grades, summary.best_final_grade), ('', None))
+        self.assertNotEqual(get_data_version(), version)
+
+    def test_rebuild_command_fixes_stale_summaries(self):
+        self.paper.reviewers.add(self.reviewer)
+        Review.objects.create(author=self.reviewer, paper=self.paper, text='', final_grade=self.accept)
+        PaperReviewSummary.objects.filter(paper=self.paper).update(reviews_count=5, best_final_grade=None)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_review_summaries', verify=True, stdout=StringIO())
+        self.assertEqual(self.get_summary().reviews_count, 5)
+
+        call_command('rebuild_review_summaries', stdout=StringIO())
+        summary = self.get_summary()
+        self.assertEqual((summary.reviews_count, summary.best_final_grade), (1, 1))
+        call_command('rebuild_review_summaries', verify=True, stdout=StringIO())
+
+
+class PaperExportTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.author = User.objects.create(username='author', first_name='Jan', last_name='Kowalski',
+                                          email='jan@example.com')
+        reviewer = User.objects.create(username='reviewer', first_name='Anna', last_name='Nowak')
+        grade = Grade.objects.create(name='Akceptacja', value='1', tag='final_grade')
+        self.paper = Paper.objects.create(title='Sieci neuronowe', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(reviewer)
+        Review.objects.create(author=reviewer, paper=self.paper, text='', final_grade=grade)
+        Paper.objects.create(title='Grafy', author=self.author, keywords='', description='')
+
+    def export(self, **params):
+        response = self.client.get(reverse('paperExport'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_export_is_only_for_staff(self):
+        self.client.force_login(self.author)
+        self.assertRedirects(self.client.get(reverse('paperExport')), reverse('paperList'), fetch_redirect_response=False)
+
+    def test_csv_contains_filtered_papers(self):
+        self.client.force_login(self.staff)
+        rows = list(csv.reader(StringIO(self.export(format='csv', title='sieci').decode('utf-8-sig'))))
+        self.assertEqual(len(rows), 2)
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row['Tytuł'], 'Sieci neuronowe')
+        self.assertEqual(row['Email autora'], 'jan@example.com')
+        self.assertEqual(row['Recenzenci'], 'Anna Nowak')
+        self.assertEqual(row['Oceny końcowe'], 'Akceptacja')
+        self.assertEqual(row['Wystawionych recenzji'], '1')
+
+    def test_xlsx_is_valid_archive_with_all_papers(self):
+        self.client.force_login(self.staff)
+        with zipfile.ZipFile(BytesIO(self.export(format='xlsx'))) as archive:
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row>'), 3)
+        self.assertIn('Sieci neuronowe', sheet)
+        self.assertIn('Grafy', sheet)
+
+    def test_unknown_format_is_rejected(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('paperExport'), {'format': 'pdf'}).status_code, 400)
+
+
+class PaperNavigationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        author = User.objects.create(username='author')
+        now = timezone.now()
+        self.pks = []
+        for i in range(7):
+            paper = Paper.objects.create(title=f'Paper {i}', author=author, keywords='', description='')
+            Paper.objects.filter(pk=paper.pk).update(updated_at=now - timedelta(hours=i))
+            self.pks.append(paper.pk)
+        self.client.force_login(self.staff)
+
+    def test_pages_are_served_from_filter_result(self):
+        response = self.client.get(reverse('paperList'))
+        token = response.context['filter_token']
+        self.assertEqual([paper.pk for paper in response.context['papers']], self.pks[:5])
+
+        response = self.client.get(reverse('paperList'), {'page': 2})
+        self.assertEqual(response.context['filter_token'], token)
+        self.assertEqual([paper.pk for paper in response.context['papers']], self.pks[5:])
+        self.assertContains(response, f'{reverse("paperDetail", args=[self.pks[5]])}?id=6&amp;t={token}')
+
+    def test_detail_page_links_to_neighbours(self):
+        token = self.client.get(reverse('paperList')).context['filter_token']
+
+        response = self.client.get(reverse('paperDetail', args=[self.pks[2]]), {'id': 3, 't': token})
+        self.assertContains(response, f'{reverse("paperDetail", args=[self.pks[1]])}?id=2&t={token}')
+        self.assertContains(response, f'{reverse("paperDetail", args=[self.pks[3]])}?id=4&t={token}')
+
+        response = self.client.get(reverse('paperDetail', args=[self.pks[0]]), {'id': 1, 't': token})
+        self.assertNotIn('prev', response.context)
+        self.assertEqual(response.context['next'], self.pks[1])
+        response = self.client.get(reverse('paperDetail', args=[self.pks[6]]), {'id': 7, 't': token})
+        self.assertEqual(response.context['prev'], self.pks[5])
+        self.assertNotIn('next', response.context)
+
+    def test_old_token_is_not_valid_after_version_is_evicted(self):
+        cache.clear()
+        token = get_filter_token(QueryDict(), self.staff)
+        Paper.objects.get(pk=self.pks[0]).save()
+        self.assertNotEqual(get_filter_token(QueryDict(), self.staff), token)
+        cache.delete(DATA_VERSION_KEY)
+        self.assertNotEqual(get_filter_token(QueryDict(), self.staff), token)
+
+
+class FacetCountsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        author = User.objects.create(username='author')
+        reviewer = User.objects.create(username='reviewer')
+        Grade.objects.create(name='Akceptacja', value='1', tag='final_grade')
+        approved = Paper.objects.create(title='A', author=author, keywords='', description='', approved=True)
+        approved.reviewers.add(reviewer)
+        Review.objects.create(author=reviewer, paper=approved, text='', final_grade=Grade.objects.get())
+        Paper.objects.create(title='B', author=author, keywords='', description='')
+
+    def test_facet_counts(self):
+        facets = PaperFilter({}, queryset=Paper.objects.all()).get_facet_counts()
+        self.assertEqual(facets['approved'], {'True': 1, 'False': 1})
+        self.assertEqual(facets['reviewers_field'], {'0': 1, '1': 1, '2': 0})
+        self.assertEqual(facets['reviews_count'], {'0': 1, '1': 1, '2': 0})
+        self.assertEqual(facets['final_grade'], {'1': 1})
+
+    def test_counts_are_shown_in_options(self):
+        self.client.force_login(self.staff)
+        form = self.client.get(reverse('paperList')).context['filter'].form
+        for name in ('approved', 'reviewers_field', 'reviews_count', 'final_grade'):
+            labels = [label for value, label in form.fields[name].choices]
+            self.assertEqual(labels.count('---------'), 1, name)
+        self.assertIn(('True', 'Gotowy (1)'), list(form.fields['approved'].choices))
+        self.assertIn(('1', 'Akceptacja (1)'), list(form.fields['final_grade'].choices))
+        self.assertContains(self.client.get(reverse('paperList')), 'W przygotowaniu (1)')
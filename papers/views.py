@@ -5,15 +5,21 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db import transaction
-from django.http import FileResponse, HttpResponseRedirect, HttpResponse
+from django.db.models import Count
+from django.http import FileResponse, HttpResponseRedirect, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.views.decorators.csrf import csrf_exempt
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View
 from django.views.static import serve
 from StronaProjektyKol.settings import SITE_NAME, BASE_DIR
+from users.roles import is_reviewer
+from .cache import get_filter_token, get_filter_result, set_filter_result, get_facets
+from .export import export_rows, stream_csv, stream_xlsx
 from .filters import PaperFilter
+from .permissions import MemoizedObjectMixin, can_view_paper, can_edit_paper, can_view_review, can_edit_review, \
+    can_add_review, paper_queryset, review_queryset, viewable_reviews
 from .forms import *
 
 
@@ -31,17 +37,27 @@ class PaperListView(LoginRequiredMixin, ListView):
         context['filter'] = PaperFilter(
             self.request.GET, queryset=self.get_queryset())
 
-        papers = context['filter'].qs.order_by('-updated_at')
-        queryset_pks = ''
-        for paper in papers:
-            queryset_pks += f'&q={paper.pk}'
-            paper.get_unread_messages = len(
-                paper.get_unread_messages(self.request.user))
-
-        context['queryset_pks'] = queryset_pks
-        context['papers_length'] = papers.count()
-
-        paginator = Paginator(papers, 5)
+        # ordered pks of the filter result are cached, so pagination and prev/next
+        # navigation on detail page don't have to run the filter again
+        token = get_filter_token(self.request.GET, self.request.user)
+        papers_pks = get_filter_result(token)
+        if papers_pks is None:
+            papers_pks = list(context['filter'].qs.order_by('-updated_at').values_list('pk', flat=True))
+            if context['filter'].search_ranking is not None:
+                ranking = {pk: position for position, pk in enumerate(context['filter'].search_ranking)}
+                papers_pks.sort(key=lambda pk: ranking.get(pk, len(ranking)))
+            set_filter_result(token, papers_pks)
+
+        context['filter_token'] = token
+        context['papers_length'] = len(papers_pks)
+        PaperFilter.apply_facet_counts(context['filter'].form,
+                                       get_facets(token, context['filter'].get_facet_counts))
+        context['popular_keywords'] = Keyword.objects \
+            .filter(paperkeyword__paper__in=self.get_queryset()) \
+            .annotate(papers_count=Count('paperkeyword')) \
+            .order_by('-papers_count', 'name')[:15]
+
+        paginator = Paginator(papers_pks, 5)
         page = self.request.GET.get('page', 1)
         try:
             context['papers'] = paginator.page(page)
@@ -50,6 +66,15 @@ class PaperListView(LoginRequiredMixin, ListView):
         except EmptyPage:
             context['papers'] = paginator.page(paginator.num_pages)
 
+        # count unread messages only for papers visible on the current page
+        page_pks = list(context['papers'].object_list)
+        papers = Paper.objects.with_list_data().in_bulk(page_pks)
+        page_papers = [papers[pk] for pk in page_pks if pk in papers]
+        unread = Paper.get_unread_messages_counts(page_papers, self.request.user)
+        for paper in page_papers:
+            paper.unread_messages_count = unread.get(paper.pk, 0)
+        context['papers'].object_list = page_papers
+
         return context
 
     def get_queryset(self):
@@ -57,54 +82,74 @@ class PaperListView(LoginRequiredMixin, ListView):
         if self.request.user.is_staff:
             return Paper.objects.all()
         # FOR REVIEWER
-        if self.request.user.groups.filter(name='reviewer').exists():
+        if is_reviewer(self.request.user):
             return Paper.objects.all().filter(reviewers=self.request.user)
         # FOR REGULAR USER
         return Paper.objects.all().filter(author=self.request.user)
 
 
-class PaperDetailView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixin, DetailView):
+class PaperExportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Streams papers matching PaperFilter parameters as CSV or XLSX file
+    """
+    FORMATS = {
+        'csv': ('text/csv; charset=utf-8', stream_csv),
+        'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', stream_xlsx),
+    }
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in self.FORMATS:
+            return HttpResponse(status=400)
+        content_type, stream = self.FORMATS[export_format]
+
+        paper_filter = PaperFilter(request.GET, queryset=Paper.objects.all())
+        papers = paper_filter.qs.order_by('-updated_at')
+
+        response = StreamingHttpResponse(stream(export_rows(papers)), content_type=content_type)
+        filename = f'artykuly_{timezone.now().strftime("%Y%m%d_%H%M")}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def handle_no_permission(self):
+        return redirect('paperList')
+
+
+class PaperDetailView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixin, MemoizedObjectMixin, DetailView):
     login_url = 'login'
     model = Paper
     context_object_name = 'paper'
 
+    def get_queryset(self):
+        return paper_queryset(self.request.user).select_related('author', 'club')
+
     def get_context_data(self, *args, **kwargs):
         context = super(PaperDetailView, self).get_context_data(**kwargs)
 
         context['reviews'] = Review.objects.filter(paper=context['paper'])
         context['site_title'] = f'Informacje o artykule - {SITE_NAME}'
-        paper_iter = 0
-
         GET_DATA = self.request.GET
 
-        if 'id' in GET_DATA and GET_DATA['id'] is not None:
+        papers_pks = get_filter_result(GET_DATA.get('t'))
+        if papers_pks is not None and GET_DATA.get('id', '').isdigit():
             paper_iter = int(GET_DATA['id'])
-        if 'q' in GET_DATA:
-            qs_list = [int(i) for i in GET_DATA.getlist('q')]
-            queryset_pks = ''
-            for itm in qs_list:
-                queryset_pks += f'&q={itm}'
-            context['queryset_pks'] = queryset_pks
-
-            if 1 < paper_iter <= len(qs_list):
-                var = Paper.objects.filter(pk=qs_list[paper_iter - 2]).first()
-                if var is not None:
-                    context['prev'] = var.pk
-                    context['prev_id'] = paper_iter - 1
-
-            if 1 <= paper_iter < len(qs_list):
-                var = Paper.objects.filter(pk=qs_list[paper_iter]).first()
-                if var is not None:
-                    context['next'] = var.pk
-                    context['next_id'] = paper_iter + 1
+            context['filter_token'] = GET_DATA['t']
+
+            if 1 < paper_iter <= len(papers_pks):
+                context['prev'] = papers_pks[paper_iter - 2]
+                context['prev_id'] = paper_iter - 1
+
+            if 1 <= paper_iter < len(papers_pks):
+                context['next'] = papers_pks[paper_iter]
+                context['next_id'] = paper_iter + 1
 
         return context
 
     def test_func(self):
-        paper = self.get_object()
-        if self.request.user == paper.author or self.request.user.groups.filter(name='reviewer').exists():
-            return True
-        return False
+        return can_view_paper(self.request.user, self.get_object())
 
     def handle_no_permission(self):
         return redirect('paperList')
@@ -120,8 +165,7 @@ def paper_file_download(request, pk, item):
     :return:
     """
     paper = Paper.objects.get(pk=pk)
-    if request.user == paper.author or request.user.groups.filter(
-            name='reviewer').exists() or request.user.is_staff:
+    if can_view_paper(request.user, paper):
         document = UploadedFile.objects.get(pk=item)
         filepath = str(BASE_DIR)+document.file.url
         return serve(request, os.path.basename(filepath), os.path.dirname(filepath))
@@ -197,16 +241,13 @@ class PaperCreateView(LoginRequiredMixin, CreateView):
         return str('/papers/')
 
 
-class PaperEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class PaperEditView(LoginRequiredMixin, UserPassesTestMixin, MemoizedObjectMixin, UpdateView):
     model = Paper
     form_class = PaperCreationForm
     template_name = 'papers/paper_add.html'
 
     def test_func(self):
-        paper = self.get_object()
-        if self.request.user == paper.author:
-            return True
-        return False
+        return can_edit_paper(self.request.user, self.get_object())
 
     def post(self, request, *args, **kwargs):
         paper = self.get_object()
@@ -233,7 +274,7 @@ class PaperEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
             context['coAuthors'] = CoAuthorFormSet(instance=self.object)
             context['files'] = UploadFileFormSet()
         context['uploaded_files'] = UploadedFile.objects.filter(
-            paper=self.get_object()).exclude(pk=self.get_object().statement)
+            paper=self.object).exclude(pk=self.object.statement)
         context['coAuthorsForm'] = render_to_string('papers/paper_add_author_formset.html',
                                                     {'formset': context['coAuthors']})
         context['filesForm'] = render_to_string('papers/upload_files_formset.html',
@@ -260,45 +301,39 @@ class PaperEditView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
 
     def get_success_url(self):
         messages.success(self.request, f'Artykuł został zmieniony')
-        paper = self.get_object()
-        return str('/papers/paper/' + str(paper.pk) + '/')
+        return str('/papers/paper/' + str(self.object.pk) + '/')
 
     def handle_no_permission(self):
         return redirect('paperList')
 
 
-class PaperDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class PaperDeleteView(LoginRequiredMixin, UserPassesTestMixin, MemoizedObjectMixin, DeleteView):
     model = Paper
     template_name = 'papers/paper_delete.html'
     success_url = '/papers'
 
     def test_func(self):
-        paper = self.get_object()
-        if self.request.user == paper.author:
-            return True
-        return False
+        return can_edit_paper(self.request.user, self.get_object())
 
     def handle_no_permission(self):
         return redirect('paperList')
 
 
-class ReviewDetailView(CsrfExemptMixin, LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class ReviewDetailView(CsrfExemptMixin, LoginRequiredMixin, UserPassesTestMixin, MemoizedObjectMixin, DetailView):
     model = Review
     context_object_name = 'review'
     template_name = 'papers/review_detail.html'
 
+    def get_queryset(self):
+        return review_queryset(self.request.user)
+
     def get_context_data(self, **kwargs):
         context = super(ReviewDetailView, self).get_context_data(**kwargs)
         context['grades'] = Grade.objects.all()
         return context
 
     def test_func(self):
-        user = self.request.user
-        paper = self.get_object().paper
-        if user.is_staff or (user.groups.filter(
-                name='reviewer').exists() and user in paper.reviewers.all()) or user == paper.author or user == self.get_object().author:
-            return True
-        return False
+        return can_view_review(self.request.user, self.get_object())
 
     def handle_no_permission(self):
         return redirect('paperList')
@@ -311,20 +346,22 @@ class ReviewListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     ordering = ['-updated_at']
 
     def get_queryset(self):
-        return Review.objects.filter(author=self.request.user).all()
+        return Review.objects.filter(author=self.request.user).with_paper_list_data()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['site_name'] = 'reviews'
         context['site_title'] = f'Recenzje - {SITE_NAME}'
-        for review in context['reviews']:
-            review.paper.get_unread_messages = len(
-                review.paper.get_unread_messages(self.request.user))
+        reviews = list(context['reviews'])
+        unread = Paper.get_unread_messages_counts([review.paper_id for review in reviews], self.request.user)
+        for review in reviews:
+            review.paper.unread_messages_count = unread.get(review.paper_id, 0)
+        context['reviews'] = reviews
         return context
 
     def test_func(self):
         user = self.request.user
-        if user.is_staff or user.groups.filter(name='reviewer').exists():
+        if user.is_staff or is_reviewer(user):
             return True
         return False
 
@@ -339,20 +376,17 @@ class ReviewCreateView(CsrfExemptMixin, LoginRequiredMixin, UserPassesTestMixin,
     form_class = ReviewCreationForm
     success_message = "Poprawnie dodano!"
 
-    def test_func(self):
-        user = self.request.user
-        paper = Paper.objects.get(pk=self.kwargs.get('paper'))
+    def get_paper(self):
+        if not hasattr(self, 'paper'):
+            self.paper = paper_queryset(self.request.user).get(pk=self.kwargs.get('paper'))
+        return self.paper
 
-        if user in [itm.author for itm in paper.review_set.all()]:
-            return False
-        if user == paper.author or (self.request.user.groups.filter(
-                name='reviewer').exists() and not user.is_staff) or paper.reviewers.filter(pk=user.pk).count() == 0:
-            return False
-        return True
+    def test_func(self):
+        return can_add_review(self.request.user, self.get_paper())
 
     def get_context_data(self, **kwargs):
         context = super(ReviewCreateView, self).get_context_data(**kwargs)
-        context['paper'] = Paper.objects.get(pk=self.kwargs.get('paper'))
+        context['paper'] = self.get_paper()
         return context
 
     def handle_no_permission(self):
@@ -360,11 +394,12 @@ class ReviewCreateView(CsrfExemptMixin, LoginRequiredMixin, UserPassesTestMixin,
 
     def form_valid(self, form):
         form.instance.author = self.request.user
-        form.instance.paper = Paper.objects.get(pk=self.kwargs.get('paper'))
+        form.instance.paper = self.get_paper()
         return super(ReviewCreateView, self).form_valid(form)
 
 
-class ReviewUpdateView(SuccessMessageMixin, CsrfExemptMixin, LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class ReviewUpdateView(SuccessMessageMixin, CsrfExemptMixin, LoginRequiredMixin, UserPassesTestMixin, MemoizedObjectMixin,
+                       UpdateView):
     model = Review
     template_name = 'papers/review_add.html'
     form_class = ReviewCreationForm
@@ -373,20 +408,20 @@ class ReviewUpdateView(SuccessMessageMixin, CsrfExemptMixin, LoginRequiredMixin,
 
     def get_context_data(self, **kwargs):
         context = super(ReviewUpdateView, self).get_context_data(**kwargs)
-        context['paper'] = super().get_object().paper
+        context['paper'] = self.object.paper
         return context
 
+    def get_queryset(self):
+        return Review.objects.select_related('paper')
+
     def test_func(self):
-        review = self.get_object()
-        if self.request.user == review.author:
-            return True
-        return False
+        return can_edit_review(self.request.user, self.get_object())
 
     def handle_no_permission(self):
         return render(self.request, template_name='papers/review_not_found.html')
 
 
-class ReviewDeleteView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixin, DeleteView):
+class ReviewDeleteView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixin, MemoizedObjectMixin, DeleteView):
     model = Review
     template_name = 'papers/review_delete.html'
     success_url = reverse_lazy('reviewSuccess')
@@ -397,10 +432,7 @@ class ReviewDeleteView(LoginRequiredMixin, UserPassesTestMixin, CsrfExemptMixin,
         return super(ReviewDeleteView, self).delete(request, *args, **kwargs)
 
     def test_func(self):
-        review = self.get_object()
-        if self.request.user == review.author:
-            return True
-        return False
+        return can_edit_review(self.request.user, self.get_object())
 
     def get_context_data(self, **kwargs):
         context = super(ReviewDeleteView, self).get_context_data(**kwargs)
@@ -421,12 +453,12 @@ class UserReviewListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     paginate_by = 5
 
     def test_func(self):
-        if self.request.user.groups.filter(name='reviewer').exists():
+        if is_reviewer(self.request.user):
             return True
         return False
 
     def get_queryset(self):
-        return Review.objects.filter(author=self.request.user)
+        return Review.objects.filter(author=self.request.user).with_paper_list_data()
 
     def handle_no_permission(self):
         return redirect('paperList')
@@ -469,12 +501,12 @@ def userReviewShow(request, **kwargs):
     paper = Paper.objects.get(pk=kwargs.get('paper'))
     reviewer = User.objects.get(pk=kwargs.get('reviewer'))
     if paper is None or reviewer is None or (
-            user.groups.filter(name='reviewer').exists() and user != paper.author and not user.is_staff):
+            is_reviewer(user) and user != paper.author and not user.is_staff):
         return HttpResponse(status=404)
-    if not user.is_staff and not user.groups.filter(name='reviewer').exists() and user != paper.author:
+    if not user.is_staff and not is_reviewer(user) and user != paper.author:
         return HttpResponse(status=404)
 
-    review = Review.objects.filter(author=reviewer, paper=paper).first()
+    review = viewable_reviews(user, Review.objects.filter(author=reviewer, paper=paper)).first()
 
     if review is None:
         if user == reviewer:
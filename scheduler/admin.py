@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import ScheduledJob
+
+
+class ScheduledJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_run_at', 'last_duration', 'runs_count', 'locked_by', 'locked_until')
+    readonly_fields = ('name', 'last_run_at', 'last_duration', 'last_error', 'runs_count', 'locked_by',
+                       'locked_until')
+
+
+admin.site.register(ScheduledJob, ScheduledJobAdmin)
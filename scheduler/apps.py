@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class SchedulerConfig(AppConfig):
+    name = 'scheduler'
+
+    def ready(self):
+        # periodic jobs are registered in jobs.py modules of installed apps
+        autodiscover_modules('jobs')
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from StronaProjektyKol.settings import SCHEDULER_TICK
+from . import schedule
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerLifespanApplication:
+    """
+    ASGI application running the scheduler in the event loop of the server between lifespan startup and shutdown,
+    every other scope is passed to the wrapped application.
+    Jobs are run in a thread of their own executor and not by sync_to_async, which runs sync views
+    on one shared thread, so a long job would block all requests of the process.
+    """
+
+    def __init__(self, application, tick=SCHEDULER_TICK):
+        self.application = application
+        self.tick = tick
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scheduler')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            await self.application(scope, receive, send)
+            return
+
+        task = None
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                task = asyncio.ensure_future(self.run())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if task is not None:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def run_pending():
+        close_old_connections()
+        try:
+            return schedule.run_pending()
+        finally:
+            close_old_connections()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(self.executor, self.run_pending)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. database is not available, jobs are tried again on the next tick
+                logger.exception('Scheduler failed to run jobs')
+            await asyncio.sleep(self.tick)
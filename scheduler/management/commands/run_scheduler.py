@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from StronaProjektyKol.settings import SCHEDULER_TICK
+from scheduler import schedule
+
+
+class Command(BaseCommand):
+    help = 'Runs registered periodic jobs, many schedulers can run at once, every job is run by only one of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run due jobs once and exit')
+        parser.add_argument('--job', help='Run only this job, even if it is not due')
+        parser.add_argument('--tick', type=float, default=SCHEDULER_TICK,
+                            help='Seconds between checks of due jobs')
+
+    def handle(self, *args, **options):
+        if options['job']:
+            if options['job'] not in schedule.jobs:
+                raise CommandError(f'Unknown job, registered jobs: {", ".join(sorted(schedule.jobs))}')
+            if not schedule.run_job(options['job'], force=True):
+                raise CommandError('Job is running in another process')
+            self.stdout.write(self.style.SUCCESS(f'Job {options["job"]} finished'))
+            return
+
+        try:
+            while True:
+                for name in schedule.run_pending():
+                    self.stdout.write(f'Job {name} finished')
+                if options['once']:
+                    break
+                time.sleep(options['tick'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class ScheduledJob(models.Model):
+    """
+    State of a periodic job shared by all processes running the scheduler,
+    the row works as a lock, so the job is run by only one of them at a time
+    """
+    name = models.CharField(max_length=64, unique=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    # duration of the last run in seconds
+    last_duration = models.FloatField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    runs_count = models.PositiveIntegerField(default=0)
+    locked_by = models.CharField(max_length=128, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
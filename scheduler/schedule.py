@@ -0,0 +1,108 @@
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from StronaProjektyKol.settings import SCHEDULER_LOCK_TIMEOUT
+from .models import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+# identifies the process holding a job's lock
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+jobs = {}
+
+
+class Job:
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+
+    def get_interval(self):
+        """
+        Returns time between runs of the job, interval can be given as a function, so it can be read from the database
+        :return: timedelta
+        """
+        interval = self.interval() if callable(self.interval) else self.interval
+        return interval if isinstance(interval, timedelta) else timedelta(seconds=interval)
+
+
+def register(name, interval):
+    """
+    Decorator registering function as a periodic job, jobs are registered in jobs.py modules of installed apps
+    :param name: string (unique name of the job)
+    :param interval: integer (seconds), timedelta or function returning one of them
+    :return: decorator
+    """
+
+    def decorator(func):
+        jobs[name] = Job(name, func, interval)
+        return func
+
+    return decorator
+
+
+def _get_state(name):
+    try:
+        return ScheduledJob.objects.get_or_create(name=name)[0]
+    except IntegrityError:
+        # row was created by another process in the meantime
+        return ScheduledJob.objects.get(name=name)
+
+
+def acquire(job, now, force=False):
+    """
+    Takes the job's lock if the job is due and no other process holds the lock,
+    it is a single conditional UPDATE, so only one process can succeed
+    :param job: Job object
+    :param now: datetime
+    :param force: boolean (if True, the job is run even if it is not due)
+    :return: boolean
+    """
+    _get_state(job.name)
+    condition = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    if not force:
+        condition &= Q(last_run_at__isnull=True) | Q(last_run_at__lte=now - job.get_interval())
+    return ScheduledJob.objects.filter(condition, name=job.name) \
+        .update(locked_by=WORKER_ID, locked_until=now + timedelta(seconds=SCHEDULER_LOCK_TIMEOUT)) == 1
+
+
+def run_job(name, force=False):
+    """
+    Runs the job if it is due and not running in any other process, duration and error of the run are recorded
+    :param name: string (name of registered job)
+    :param force: boolean (if True, the job is run even if it is not due)
+    :return: boolean (True if the job was run)
+    """
+    job = jobs[name]
+    started_at = timezone.now()
+    if not acquire(job, started_at, force):
+        return False
+
+    start = time.perf_counter()
+    error = ''
+    try:
+        job.func()
+    except Exception as exception:
+        logger.exception('Scheduled job %s failed', name)
+        error = f'{type(exception).__name__}: {exception}'
+    finally:
+        ScheduledJob.objects.filter(name=name, locked_by=WORKER_ID).update(
+            last_run_at=started_at, last_duration=time.perf_counter() - start, last_error=error,
+            runs_count=F('runs_count') + 1, locked_by='', locked_until=None)
+    return True
+
+
+def run_pending():
+    """
+    Runs all due jobs one after another
+    :return: list of names of run jobs
+    """
+    return [name for name in list(jobs) if run_job(name)]
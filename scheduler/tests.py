@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import schedule
+from .lifespan import SchedulerLifespanApplication
+from .models import ScheduledJob
+
+
+class SchedulerTest(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs = {'test': schedule.Job('test', lambda: self.calls.append(1), timedelta(minutes=5)),
+                'broken': schedule.Job('broken', lambda: 1 / 0, 60)}
+        patcher = mock.patch.object(schedule, 'jobs', jobs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_due_job_is_run_once_per_interval(self):
+        with self.assertLogs('scheduler.schedule', 'ERROR'):
+            self.assertEqual(schedule.run_pending(), ['test', 'broken'])
+        self.assertEqual(schedule.run_pending(), [])
+        self.assertEqual(len(self.calls), 1)
+
+        state = ScheduledJob.objects.get(name='test')
+        self.assertEqual(state.runs_count, 1)
+        self.assertIsNotNone(state.last_duration)
+        self.assertIsNone(state.locked_until)
+        self.assertIn('ZeroDivisionError', ScheduledJob.objects.get(name='broken').last_error)
+
+        ScheduledJob.objects.filter(name='test').update(last_run_at=timezone.now() - timedelta(minutes=6))
+        self.assertEqual(schedule.run_pending(), ['test'])
+
+    def test_job_locked_by_other_process_is_skipped(self):
+        ScheduledJob.objects.create(name='test', locked_by='other:1', locked_until=timezone.now() + timedelta(minutes=1))
+        self.assertFalse(schedule.run_job('test', force=True))
+        self.assertEqual(self.calls, [])
+
+        # lock of a crashed process expires
+        ScheduledJob.objects.filter(name='test').update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(schedule.run_job('test'))
+
+    def test_notifications_can_be_triggered_only_by_staff(self):
+        self.client.force_login(User.objects.create(username='user'))
+        self.assertEqual(self.client.get(reverse('sendNotificationEmail')).status_code, 403)
+
+
+class SchedulerLifespanTest(SimpleTestCase):
+    @staticmethod
+    async def request(application, path):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        await application({'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': [],
+                           'server': ('testserver', 80)}, receive, send)
+        return sent[0]['status']
+
+    def test_requests_are_not_blocked_by_running_job(self):
+        started = threading.Event()
+
+        def slow_jobs():
+            started.set()
+            time.sleep(1)
+            return []
+
+        async def scenario():
+            application = SchedulerLifespanApplication(get_asgi_application(), tick=60)
+            lifespan = asyncio.Queue()
+            await lifespan.put({'type': 'lifespan.startup'})
+            task = asyncio.ensure_future(application({'type': 'lifespan'}, lifespan.get, lambda message: asyncio.sleep(0)))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+
+            start = time.perf_counter()
+            # view is run by the thread which runs all sync views of the ASGI handler
+            status = await self.request(application, reverse('stream_messages'))
+            elapsed = time.perf_counter() - start
+
+            await lifespan.put({'type': 'lifespan.shutdown'})
+            await task
+            return status, elapsed
+
+        with mock.patch.object(schedule, 'run_pending', slow_jobs):
+            status, elapsed = asyncio.run(scenario())
+        self.assertEqual(status, 503)
+        self.assertLess(elapsed, 0.5)
@@ -0,0 +1,102 @@
+import atexit
+import logging
+import threading
+
+from django.db import connections
+from django.db.models import Case, DateTimeField, Value, When
+
+from StronaProjektyKol.settings import USER_ACTIVITY_FLUSH_INTERVAL
+from .models import UserDetail
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """
+    Collects times when users were last seen in the process memory, a background thread of the process
+    saves them in bulk every flush interval, so requests don't write to the database
+    """
+
+    def __init__(self, interval=USER_ACTIVITY_FLUSH_INTERVAL, autoflush=True):
+        self.interval = interval
+        # without autoflush times are saved only by calling flush()
+        self.autoflush = autoflush
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def touch(self, user_id, when):
+        """
+        Records user's activity, it is saved by the background thread at most flush interval later
+        :param user_id: integer
+        :param when: datetime
+        :return:
+        """
+        with self._lock:
+            self._seen[user_id] = when
+            # thread is started lazily, so it also runs in server processes forked after the module was imported
+            if self.autoflush and not self._stopped.is_set() and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='activity-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Unable to save users activity')
+            finally:
+                # thread has its own database connections, they are not reused between flushes
+                connections.close_all()
+
+    def stop(self):
+        """
+        Stops the background thread, buffered times are kept until flush() is called
+        :return:
+        """
+        self._stopped.set()
+
+    def flush(self):
+        """
+        Saves buffered times with a fixed number of queries, notification flag is reset only for users who were notified
+        :return: integer (number of saved users)
+        """
+        with self._lock:
+            seen, self._seen = self._seen, {}
+        if not seen:
+            return 0
+
+        try:
+            details = UserDetail.objects.filter(user__in=seen.keys())
+            updated = details.update(last_seen=Case(*[When(user=user_id, then=Value(when))
+                                                      for user_id, when in seen.items()],
+                                                    output_field=DateTimeField()))
+            UserDetail.objects.filter(user__in=seen.keys(), email_notification_sent=True) \
+                .update(email_notification_sent=False)
+            if updated < len(seen):
+                missing = seen.keys() - set(details.values_list('user', flat=True))
+                UserDetail.objects.bulk_create([UserDetail(user_id=user_id, last_seen=seen[user_id])
+                                                for user_id in missing], ignore_conflicts=True)
+        except Exception:
+            # e.g. database is locked, times are kept for the next flush unless newer ones were recorded
+            with self._lock:
+                for user_id, when in seen.items():
+                    self._seen.setdefault(user_id, when)
+            raise
+        return len(seen)
+
+
+buffer = ActivityBuffer()
+
+
+def _flush_on_exit():
+    buffer.stop()
+    try:
+        buffer.flush()
+    except Exception:
+        logger.exception('Unable to save users activity')
+
+
+# buffered activity is saved when the server process shuts down gracefully
+atexit.register(_flush_on_exit)
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from papers.models import NotificationPeriod
+from scheduler.schedule import register
+from . import activity
+from .notifications import send_unread_notifications
+
+
+def notification_interval():
+    period = NotificationPeriod.objects.first()
+    return period.period if period is not None else timedelta(hours=1)
+
+
+@register('unread_notifications', notification_interval)
+def unread_notifications():
+    """
+    Sends emails about unread messages not more often than NotificationPeriod allows
+    """
+    period = NotificationPeriod.objects.first()
+    now = timezone.now()
+    if period is None or now - period.last_used < timedelta(seconds=period.period):
+        return
+    # activity buffered by this process is saved first, so active users are not notified,
+    # other processes save theirs at most USER_ACTIVITY_FLUSH_INTERVAL later
+    activity.buffer.flush()
+    send_unread_notifications(now)
+    NotificationPeriod.objects.filter(pk=period.pk).update(last_used=now)
+
+
+@register('clear_expired_sessions', timedelta(days=1))
+def clear_expired_sessions():
+    import_string(f'{settings.SESSION_ENGINE}.SessionStore').clear_expired()
@@ -0,0 +1,52 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from papers.models import Message, NotificationPeriod, Paper
+from users.models import UserDetail
+from users.notifications import send_unread_notifications
+
+
+class Command(BaseCommand):
+    help = 'Measures sending of unread messages notifications on generated data, all generated data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Number of generated users')
+        parser.add_argument('--papers', type=int, default=500, help='Number of generated papers')
+        parser.add_argument('--messages', type=int, default=10, help='Number of messages per paper')
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(0)
+        prefix = f'benchmark-{time.time()}'
+        with transaction.atomic():
+            users = User.objects.bulk_create([User(username=f'{prefix}-{i}', email=f'user{i}@example.com')
+                                              for i in range(options['users'])])
+            users = list(User.objects.filter(username__startswith=prefix))
+            UserDetail.objects.bulk_create([UserDetail(user=user, last_seen=timezone.now() - timedelta(days=30))
+                                            for user in users])
+            if not NotificationPeriod.objects.exists():
+                NotificationPeriod.objects.create(name='benchmark', period=60 * 60)
+
+            Paper.objects.bulk_create([Paper(title=f'{prefix} {i}', author=randomizer.choice(users), keywords='',
+                                             description='') for i in range(options['papers'])], batch_size=500)
+            papers = list(Paper.objects.filter(title__startswith=prefix))
+            messages = []
+            for paper in papers:
+                reviewer = randomizer.choice(users)
+                paper.reviewers.add(reviewer)
+                messages += [Message(author=randomizer.choice([paper.author, reviewer]), paper=paper,
+                                     reviewer=reviewer, text='benchmark') for _ in range(options['messages'])]
+            Message.objects.bulk_create(messages, batch_size=500)
+
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                queued = send_unread_notifications()
+            self.stdout.write(f'Queued {queued} emails to {len(users)} users about {len(papers)} papers '
+                              f'in {time.perf_counter() - start:.2f} s using {len(queries)} queries')
+            transaction.set_rollback(True)
@@ -1,22 +1,23 @@
 from django.utils import timezone
-from .models import UserDetail
+from django.utils.functional import empty
+
+from . import activity
 
 
 class UpdateLastActivityMiddleware:
     """
-    Middleware that keeps track when each user was last seen on the page
+    Middleware that keeps track when each user was last seen on the page,
+    times are buffered and saved at most every USER_ACTIVITY_FLUSH_INTERVAL seconds.
+    Activity is recorded only when the view loaded the user, so requests answered without the database
+    (e.g. polls of a conversation without new messages) don't load the session and the user only for this.
     """
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         assert hasattr(request, 'user'), 'The UpdateLastActivityMiddleware requires authentication middleware to be installed.'
-        if request.user.is_authenticated:
-            userLastSeen = UserDetail.objects.filter(user=request.user)
-            if userLastSeen:
-                userLastSeen.update(last_seen=timezone.now(), email_notification_sent=False)
-            else:
-                userLastSeen.create(user=request.user)
         response = self.get_response(request)
+        if getattr(request.user, '_wrapped', None) is not empty and request.user.is_authenticated:
+            activity.buffer.touch(request.user.pk, timezone.now())
         return response
 
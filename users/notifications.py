@@ -0,0 +1,96 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.mail import BadHeaderError, EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.template import loader
+from django.utils import timezone
+
+from StronaProjektyKol.settings import SITE_NAME, SITE_DOMAIN, SITE_ADMIN_MAIL
+from mailing.models import OutgoingEmail
+from mailing.outbox import prepare
+from papers.models import Message, MessageReadCursor, NotificationPeriod
+from .models import UserDetail
+
+
+def _unread_counts(messages, reader_field):
+    """
+    Counts messages unread by the user stored in reader_field of every message, grouped by (reader, paper)
+    :param messages: Message queryset
+    :param reader_field: string (path to the reader, e.g. 'reviewer')
+    :return: queryset of dicts with reader, paper, paper__title and unread
+    """
+    cursor = MessageReadCursor.objects.filter(reader=OuterRef(reader_field), paper=OuterRef('paper'),
+                                              reviewer=OuterRef('reviewer')).values('last_read_message_id')[:1]
+    return messages.exclude(author=F(reader_field)) \
+        .annotate(reader=F(reader_field), read_cursor=Coalesce(Subquery(cursor), 0)) \
+        .filter(pk__gt=F('read_cursor')) \
+        .order_by() \
+        .values('reader', 'paper', 'paper__title') \
+        .annotate(unread=Count('pk'))
+
+
+def unread_digests(now=None):
+    """
+    Finds users who haven't visited the site for the notification period, haven't been notified yet
+    and have unread messages (as paper's author or as the reviewer of a conversation).
+    Number of queries doesn't depend on number of users, papers or messages.
+    :param now: datetime (current time by default)
+    :return: list of tuples (UserDetail object with user loaded, list of dicts with count, title and id of a paper)
+    """
+    period = NotificationPeriod.objects.first()
+    if period is None:
+        return []
+    cutoff = (now or timezone.now()) - timedelta(seconds=period.period)
+    details = UserDetail.objects.filter(last_seen__lt=cutoff, email_notification_sent=False)
+
+    candidates = details.values('user')
+    papers = defaultdict(list)
+    for row in [*_unread_counts(Message.objects.filter(paper__author__in=candidates), 'paper__author'),
+                *_unread_counts(Message.objects.filter(reviewer__in=candidates, paper__reviewers=F('reviewer'))
+                                .exclude(paper__author=F('reviewer')), 'reviewer')]:
+        papers[row['reader']].append({'count': row['unread'], 'title': row['paper__title'], 'id': row['paper']})
+    if not papers:
+        return []
+
+    return [(detail, sorted(papers[detail.user_id], key=lambda paper: paper['id']))
+            for detail in details.filter(user__in=papers.keys()).select_related('user').order_by('user')]
+
+
+def send_unread_notifications(now=None):
+    """
+    Puts emails about unread messages to users returned by unread_digests in the outbox,
+    users are marked as notified, so they get next email only after visiting the site again
+    :param now: datetime (current time by default)
+    :return: integer (number of queued emails)
+    """
+    subject = f'Posiadasz nieprzeczytane wiadomości - {SITE_NAME}'
+    template = loader.get_template('papers/paper_unseen_mail.html')
+
+    entries, notified = [], []
+    for detail, papers in unread_digests(now):
+        content = template.render({
+            'subject': subject,
+            'messages': papers,
+            'domain': SITE_DOMAIN,
+            'site_name': SITE_NAME,
+            'last_seen': detail.last_seen,
+            'protocol': 'https',
+        })
+        email = EmailMultiAlternatives(subject, content, SITE_ADMIN_MAIL, [detail.user.email],
+                                       headers={'Reply-To': SITE_ADMIN_MAIL})
+        email.attach_alternative(content, "text/html")
+        try:
+            entries.append(prepare(email))
+        except BadHeaderError:
+            continue
+        notified.append(detail.pk)
+
+    if not entries:
+        return 0
+    with transaction.atomic():
+        OutgoingEmail.objects.bulk_create(entries)
+        UserDetail.objects.filter(pk__in=notified).update(email_notification_sent=True)
+    return len(entries)
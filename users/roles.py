@@ -0,0 +1,55 @@
+import uuid
+
+from django.core.cache import cache
+
+from StronaProjektyKol.settings import USER_GROUPS_CACHE_TIMEOUT
+
+GROUPS_VERSION_KEY = 'users:groups_version'
+USER_GROUPS_KEY = 'users:groups:{pk}:{version}'
+REVIEWER_GROUP = 'reviewer'
+
+
+def get_groups_version():
+    """
+    Returns current version of group memberships, it changes every time any membership or group changes.
+    Version is random, so when its key is evicted no group names cached under an older version become valid again.
+    Cache must be shared by all server processes, otherwise other processes don't see the change.
+    :return: string
+    """
+    return cache.get_or_set(GROUPS_VERSION_KEY, lambda: uuid.uuid4().hex[:12], None)
+
+
+def bump_groups_version():
+    """
+    Invalidates cached group names of all users
+    :return:
+    """
+    cache.set(GROUPS_VERSION_KEY, uuid.uuid4().hex[:12], None)
+
+
+def get_user_groups(user):
+    """
+    Returns names of groups the user belongs to, names are loaded once per request
+    (they are remembered on the user object) and kept in cache between requests
+    :param user: User object
+    :return: frozenset of strings
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    groups = getattr(user, '_group_names', None)
+    if groups is None:
+        key = USER_GROUPS_KEY.format(pk=user.pk, version=get_groups_version())
+        groups = cache.get(key)
+        if groups is None:
+            groups = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, groups, USER_GROUPS_CACHE_TIMEOUT)
+        user._group_names = groups
+    return groups
+
+
+def is_in_group(user, group_name):
+    return group_name in get_user_groups(user)
+
+
+def is_reviewer(user):
+    return is_in_group(user, REVIEWER_GROUP)
@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from .models import UserDetail
-from django.contrib.auth.models import User
+from .roles import bump_groups_version
+from django.contrib.auth.models import User, Group
 from django.dispatch import receiver
 
 
@@ -21,3 +22,22 @@ def create_user_details(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_details(sender, instance, **kwargs):
     instance.userdetail.save()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_groups(sender, action, **kwargs):
+    """
+    Invalidates cached group names when group membership changes
+    :param sender: User.groups through model
+    :param action: string
+    :param kwargs:
+    :return:
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_groups_version()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_groups(sender, **kwargs):
+    bump_groups_version()
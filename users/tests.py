@@ -1 +1,147 @@
-# Create your tests here.
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User, Group
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from mailing.models import OutgoingEmail
+from mailing.outbox import send_queued
+from papers.models import Message, NotificationPeriod, Paper
+from . import activity
+from .models import UserDetail
+from .notifications import send_unread_notifications
+
+from .roles import GROUPS_VERSION_KEY, get_user_groups, is_reviewer
+
+
+class UserRolesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name='reviewer')
+        self.user = User.objects.create(username='reviewer')
+
+    def test_groups_are_cached_between_requests(self):
+        self.user.groups.add(self.group)
+        self.assertTrue(is_reviewer(User.objects.get(pk=self.user.pk)))
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_reviewer(user))
+            self.assertEqual(get_user_groups(user), {'reviewer'})
+
+    def test_membership_change_invalidates_cache(self):
+        self.assertFalse(is_reviewer(User.objects.get(pk=self.user.pk)))
+        self.user.groups.add(self.group)
+        self.assertTrue(is_reviewer(User.objects.get(pk=self.user.pk)))
+        self.group.user_set.remove(self.user)
+        self.assertFalse(is_reviewer(User.objects.get(pk=self.user.pk)))
+
+    def test_evicted_version_does_not_revive_old_groups(self):
+        self.user.groups.add(self.group)
+        cache.clear()
+        self.assertTrue(is_reviewer(User.objects.get(pk=self.user.pk)))
+        self.group.user_set.remove(self.user)
+        cache.delete(GROUPS_VERSION_KEY)
+        self.assertFalse(is_reviewer(User.objects.get(pk=self.user.pk)))
+
+
+class UnreadNotificationsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username='author', email='author@example.com')
+        self.reviewer = User.objects.create(username='reviewer', email='reviewer@example.com')
+        self.paper = Paper.objects.create(title='Paper', author=self.author, keywords='', description='')
+        self.paper.reviewers.add(self.reviewer)
+        NotificationPeriod.objects.create(name='day', period=60 * 60 * 24)
+        # last visit two days ago, period is checked in days as well, not only in seconds
+        UserDetail.objects.update(last_seen=timezone.now() - timedelta(days=2, seconds=1))
+
+    def test_only_users_with_unread_messages_are_notified_once(self):
+        Message.objects.create(author=self.reviewer, paper=self.paper, reviewer=self.reviewer, text='1')
+        Message.objects.create(author=self.reviewer, paper=self.paper, reviewer=self.reviewer, text='2')
+
+        with self.assertNumQueries(8):
+            self.assertEqual(send_unread_notifications(), 1)
+        send_queued()
+        self.assertEqual(mail.outbox[0].to, ['author@example.com'])
+        self.assertIn('2 nowych wiadomości na temat artykułu Paper', mail.outbox[0].body)
+        self.assertTrue(UserDetail.objects.get(user=self.author).email_notification_sent)
+
+        self.assertEqual(send_unread_notifications(), 0)
+
+
+class PasswordResetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user', email='user@example.com')
+        self.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True)
+
+    def test_reset_link_is_not_kept_in_outbox(self):
+        self.client.post(reverse('password_reset'), {'email': 'user@example.com'})
+        entry = OutgoingEmail.objects.get()
+        self.assertTrue(entry.sensitive)
+        uid = entry.body.split('/reset/')[1].split('/')[0]
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:mailing_outgoingemail_change', args=[entry.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, f'/reset/{uid}/')
+
+        send_queued()
+        self.assertIn(f'/reset/{uid}/', mail.outbox[0].body)
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.body, entry.html_body), (OutgoingEmail.SENT, '', ''))
+
+
+class LastActivityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.buffer = activity.ActivityBuffer(interval=60, autoflush=False)
+        patcher = mock.patch.object(activity, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        UserDetail.objects.update(last_seen=timezone.now() - timedelta(days=1), email_notification_sent=True)
+
+    def test_activity_is_saved_in_bulk(self):
+        self.client.get(reverse('index'))
+        detail = UserDetail.objects.get(user=self.user)
+        self.assertTrue(detail.email_notification_sent)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.buffer.flush(), 1)
+        detail.refresh_from_db()
+        self.assertFalse(detail.email_notification_sent)
+        self.assertLess(timezone.now() - detail.last_seen, timedelta(minutes=1))
+
+        # nothing changed, nothing is written
+        with self.assertNumQueries(0):
+            self.assertEqual(self.buffer.flush(), 0)
+
+
+class SignallingBuffer(activity.ActivityBuffer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.flushed = threading.Event()
+
+    def flush(self):
+        saved = super().flush()
+        if saved:
+            self.flushed.set()
+        return saved
+
+
+class ActivityAutoflushTest(TransactionTestCase):
+    def test_activity_is_saved_without_further_requests(self):
+        user = User.objects.create(username='user')
+        UserDetail.objects.update(last_seen=timezone.now() - timedelta(days=1))
+        buffer = SignallingBuffer(interval=0.05)
+        self.addCleanup(buffer.stop)
+
+        now = timezone.now()
+        buffer.touch(user.pk, now)
+        # database is not read in the meantime, so the background thread can't find it locked
+        self.assertTrue(buffer.flushed.wait(5))
+        self.assertEqual(UserDetail.objects.get(user=user).last_seen, now)
@@ -4,7 +4,7 @@ from django.contrib import messages
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.forms import PasswordResetForm
 # for login_required
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import BadHeaderError
@@ -13,17 +13,17 @@ from django.db.models.query_utils import Q
 from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.template import loader
-from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 # for TemplateView classes
 from django.views.generic import ListView, TemplateView
 from StronaProjektyKol.settings import SITE_NAME, SITE_DOMAIN, SITE_ADMIN_MAIL, SITE_ADMIN_PHONE
-from papers.models import Announcement, NotificationPeriod, Paper
+from mailing.outbox import enqueue
+from papers.models import Announcement
+from scheduler import schedule
 # forms
 from .forms import UserLoginForm, UserPasswordChangeForm
 from .forms import UserRegisterForm
-from .models import UserDetail
 
 
 class IndexView(ListView):
@@ -40,56 +40,18 @@ class IndexView(ListView):
         return context
 
 
-class SendNotificationsView(TemplateView):
+class SendNotificationsView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """
+    Emails about unread messages are sent by the scheduler, staff can trigger the job earlier,
+    it still runs only if NotificationPeriod allows and no other process is running it
+    """
     template_name = 'users/check_notifications.html'
 
+    def test_func(self):
+        return self.request.user.is_staff
+
     def send_notification(self):
-        period = NotificationPeriod.objects.all().first().period
-        for user in User.objects.all():
-            userDetail = UserDetail.objects.filter(user=user).first()
-            try:
-                difference = timezone.now() - userDetail.last_seen
-            except:
-                continue
-
-            if difference.seconds > period:
-                papers = []
-
-                for paper in Paper.objects.filter():
-                    if user == paper.author or user in paper.reviewers.all():
-                        messages = paper.get_unread_messages(user)
-                        if len(messages) > 0:
-                            papers.append((paper.title, messages, paper.pk))
-
-                if len(papers) > 0 and not userDetail.email_notification_sent:
-                    messages = []
-                    for paper in papers:
-                        messages.append(({'count': len(paper[1]), 'title': paper[0], 'id': paper[2]}))
-
-                    userDetail.email_notification_sent = True
-                    userDetail.save()
-
-                    # now send an email
-                    subject = f'Posiadasz nieprzeczytane wiadomości - {SITE_NAME}'
-                    plaintext = loader.get_template('papers/paper_unseen_mail.html')
-                    htmltemp = loader.get_template('papers/paper_unseen_mail.html')
-                    c = {
-                        'subject': subject,
-                        'messages': messages,
-                        'domain': SITE_DOMAIN,
-                        'site_name': SITE_NAME,
-                        'last_seen': userDetail.last_seen,
-                        'protocol': 'https',
-                    }
-                    text_content = plaintext.render(c)
-                    html_content = htmltemp.render(c)
-                    try:
-                        msg = EmailMultiAlternatives(subject, text_content, SITE_ADMIN_MAIL, [user.email],
-                                                     headers={'Reply-To': SITE_ADMIN_MAIL})
-                        msg.attach_alternative(html_content, "text/html")
-                        msg.send()
-                    except BadHeaderError:
-                        return HttpResponse('Invalid header found.')
+        schedule.run_job('unread_notifications', force=True)
 
     def get(self, request, *args, **kwargs):
         self.send_notification()
@@ -264,7 +226,7 @@ def password_reset_request(request):
                     msg = EmailMultiAlternatives(subject, text_content, SITE_ADMIN_MAIL, [user.email],
                                                  headers={'Reply-To': SITE_ADMIN_MAIL})
                     msg.attach_alternative(html_content, "text/html")
-                    msg.send()
+                    enqueue([msg], sensitive=True)
                 except BadHeaderError:
                     return HttpResponse('Invalid header found.')
                 return redirect('password_reset_done')